@@ -1,17 +1,43 @@
-import pandas as pd
+import functools
+import os
+import sys
+
 import numpy as np
 from datetime import datetime
-from math import log, e
 from plotly import graph_objects as go
 import plotly.express as px
 import dash
+import flask
+from flask_compress import Compress
 import plotly.figure_factory as ff
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import MissingCallbackContextException, PreventUpdate
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 
-app = dash.Dash(__name__)
+import api
+import dataset
+import downsample
+import figure_cache
+import figure_encoding
+import ingest
+import metrics
+import refresh
+
+# Responses of at least COVID_COMPRESS_MIN_SIZE bytes are sent Brotli or
+# gzip compressed, whichever the browser accepts
+server = flask.Flask(__name__)
+server.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_MIN_SIZE=int(os.environ.get('COVID_COMPRESS_MIN_SIZE', 1024)),
+    COMPRESS_BR_LEVEL=4,
+    COMPRESS_MIMETYPES=['application/json', 'application/javascript', 'text/css',
+                        'text/html', 'text/plain'],
+)
+Compress(server)
+
+app = dash.Dash(__name__, server=server)
 
 my_css_url = "https://maxcdn.bootstrapcdn.com/bootstrap/3.3.7/css/bootstrap.min.css"
 my_css_url = "https://codepen.io/amyoshino/pen/jzXypZ.css"
@@ -21,294 +47,495 @@ app.css.append_css({
 
 app.config['suppress_callback_exceptions'] = True
 
-us_state_abbrev = {
-    'Alabama': 'AL',
-    'Alaska': 'AK',
-    'Arizona': 'AZ',
-    'Arkansas': 'AR',
-    'California': 'CA',
-    'Colorado': 'CO',
-    'Connecticut': 'CT',
-    'Delaware': 'DE',
-    'District of Columbia': 'DC',
-    'Florida': 'FL',
-    'Georgia': 'GA',
-    'Guam': 'GU',
-    'Hawaii': 'HI',
-    'Idaho': 'ID',
-    'Illinois': 'IL',
-    'Indiana': 'IN',
-    'Iowa': 'IA',
-    'Kansas': 'KS',
-    'Kentucky': 'KY',
-    'Louisiana': 'LA',
-    'Maine': 'ME',
-    'Maryland': 'MD',
-    'Massachusetts': 'MA',
-    'Michigan': 'MI',
-    'Minnesota': 'MN',
-    'Mississippi': 'MS',
-    'Missouri': 'MO',
-    'Montana': 'MT',
-    'Nebraska': 'NE',
-    'Nevada': 'NV',
-    'New Hampshire': 'NH',
-    'New Jersey': 'NJ',
-    'New Mexico': 'NM',
-    'New York': 'NY',
-    'North Carolina': 'NC',
-    'North Dakota': 'ND',
-    'Northern Mariana Islands': 'MP',
-    'Ohio': 'OH',
-    'Oklahoma': 'OK',
-    'Oregon': 'OR',
-    'Pennsylvania': 'PA',
-    'Rhode Island': 'RI',
-    'South Carolina': 'SC',
-    'South Dakota': 'SD',
-    'Tennessee': 'TN',
-    'Texas': 'TX',
-    'Utah': 'UT',
-    'Vermont': 'VT',
-    'Virginia': 'VA',
-    'Washington': 'WA',
-    'West Virginia': 'WV',
-    'Wisconsin': 'WI',
-    'Wyoming': 'WY'
-}
+# Redraw the maps and pies in the browser instead of per slider move
+CLIENTSIDE_MAPS = os.environ.get('COVID_CLIENTSIDE_MAPS', '') == '1'
+PIE_THRESHOLD = 0.02
+METRIC_LABELS = {'confirmed': 'Cases', 'deaths': 'Deaths', 'recovered': 'Recoveries'}
+# Per-location line graphs keep about one point per two pixels of width
+POINTS_PER_PIXEL = 0.5
+DEFAULT_WIDTH = 1200
+# The per-location view starts with the top locations by the latest count
+TOP_PRESETS = (5, 10, 20)
+DEFAULT_TOP = 10
+# Time-lapse maps have a frame per ANIMATION_STEP days, ending on the latest
+ANIMATION_STEP = int(os.environ.get('COVID_ANIMATION_STEP', 1))
+ANIMATION_FRAME_MS = 100
+# Animated map colors are log10 counts quantized to 1/25 of a decade, so a
+# frame's values fit in one byte per location
+LEVELS_PER_DECADE = 25
 
 ### CLEANING OUT THE DATA ###
 
-us_time_series = pd.read_csv(
-    "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_US.csv")
-global_time_series = pd.read_csv(
-    "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv")
-us_time_series = us_time_series.drop(
-    ["UID", "code3", "FIPS", "Lat", "Long_"], axis=1)
-global_time_series = global_time_series.drop(
-    ["Province/State", "Lat", "Long"], axis=1)
-global_time_series = global_time_series.groupby(
-    'Country/Region', as_index=False).sum()
-us_time_series = us_time_series.groupby('Province_State', as_index=False).sum()
+if os.environ.get('COVID_ROLE') == 'worker':
+    # A server worker only maps the snapshot published by the loader process
+    # and follows it to new versions; see gunicorn.conf.py
+    snapshot = ingest.attach()
+    if snapshot is None:
+        raise RuntimeError('No data snapshot in %s, start the loader first' % ingest.CACHE_DIR)
+    store = dataset.DatasetStore(snapshot)
+    follower = refresh.SnapshotFollower(store)
+
+    @app.server.before_request
+    def follow_snapshot():
+        follower.check()
+else:
+    store = dataset.DatasetStore(ingest.load())
+    refresher = refresh.Refresher(store).start()
 
+### APP LAYOUT ###
 
-us_totals = us_time_series.drop(
-    "Province_State", axis=1).sum(axis=0)[1:].to_list()
-global_totals = global_time_series.drop(
-    "Country/Region", axis=1).sum(axis=0)[1:].to_list()
+# Both tabs are in the layout with their default figures already drawn,
+# so a page view runs no callbacks and switching tabs keeps their state
+@functools.lru_cache(maxsize=2)
+def cached_layout(data):
+    return html.Div([
+        dcc.Tabs(id='tabs', value='tab-1', children=[
+            dcc.Tab(label='United States', value='tab-1', children=us_page(data)),
+            dcc.Tab(label='Global', value='tab-2', children=global_page(data)),
+        ]),
+        dcc.Store(id='dataset_version', data=data.version),
+        dcc.Store(id='viewport_width'),
+        dcc.Interval(id='version_check', interval=60 * 1000)
+    ])
 
-### APP LAYOUT ###
 
-app.layout = html.Div([
-    dcc.Tabs(id='tabs', value='tab-1', children=[
-        dcc.Tab(label='United States', value='tab-1'),
-        dcc.Tab(label='Global', value='tab-2'),
-    ]),
-    html.Div(id='tab-content')
-])
-
-us_page = html.Div(children=[
-
-    html.Div(className='row', children=[
-        html.H1("United States COVID-19 Case Data",
-                style={'text-align': 'center', 'margin-top': 40, 'margin-bottom':
-                       10}),
-    ]),
-
-    html.Div(className='row', children=[
-        html.H4("Made by Aarush Gupta and Shikhar Ahuja",
-                style={'text-align': 'center', 'margin-top': 0, 'margin-bottom':
-                       20}),
-    ]),
-
-    html.Hr(),
-
-    html.Div(className='row', children=[
-
-        html.Div(className="four columns", children=[
-             html.Button('Switch Graph View',
-                         id='us_line_graph_button', n_clicks=0)
-             ], style={'margin-top': 30, 'text-align': 'center', 'color': 'white'}),
-
-        html.Div(className="seven columns", children=[
-            html.P("\nThis graph represents the number of cases of COVID-19 in the U.S. as a function of days after January 22, 2020. This data was collected by John Hopkins University and made freely available on GitHub. Toggle the button on the left to switch between graphs displaying data for states/provinces and totals for the United States. To view data only for a specific state, double-click its name in the legend of the graph. You can also compare the data of two or more states in this way as well.")
-        ])
-
-    ]),
-
-    html.Div(className='row', children=[
-        dcc.Graph(id='us_line_graph', config={'displayModeBar': False},
-                  animate=True)
-    ], style={'margin-left': 50, 'margin-right': 50}),
-
-    html.Div(className='row', children=[
-        html.P("The graph below plots the new daily cases versus the number of total cases at some point in time. Like for the graph above, click the button to toggle the graph data and click on a specific state to view its graph alone. Plotting the new cases versus total cases can help determine the type of growth of the curve. If points lie roughly along a straight line, this means that the number of new cases increases rapidly as the totals increase, which implies exponential growth. On the other hand, flat and declining curves imply constant and slowing growth, respectively. Due to the volatality of the graph, only a rough idea of the type of growth curve can be obtained.")
-    ], style={'margin': 50}),
-
-    html.Div(className='row', children=[
-        dcc.Graph(id='us_line_graph_2', config={'displayModeBar': False},
-                  animate=True)
-    ], style={'margin-left': 50, 'margin-right': 50}),
-
-    html.Div(className='row', children=[
-        html.Div(className="eight columns", children=[
-             dcc.Graph(id='us_map', style={"height": 500},
-                       config={'displayModeBar': False})
-             ]),
-        html.Div(className="three columns", children=[
-            html.P(
-                 "This is a cloropleth map of COVID-19 cases in the United States. Note that the colors are scaled logarithmically so that differences are more visible. Move the slider below to change the day of the data the map is showing."),
-            html.Div(className="row", children=[
-                dcc.Slider(
-                     id='us_day_slider',
-                     min=0,
-                     max=us_time_series.shape[1] - 3,
-                     step=1,
-                     value=us_time_series.shape[1] - 3,
-                     ),
-            ], style={"margin-top": 50})
-        ], style={"margin-top": 150})
-    ]),
-
-    html.Div(className='row', children=[
-        html.Div(children=[
-             dcc.Graph(id='us_pie', config={'displayModeBar': False})
-             ], className="six columns")
+def serve_layout():
+    return cached_layout(store.current)
+
+
+app.layout = serve_layout
+
+
+def metric_options(data, region):
+    return [{'label': METRIC_LABELS[metric], 'value': metric}
+            for metric in data.metrics(region)]
+
+
+def us_page(data):
+    us_data = data['us']
+    figures = initial_figures(data, 'us')
+
+    return html.Div(children=[
+
+        html.Div(className='row', children=[
+            html.H1("United States COVID-19 Case Data",
+                    style={'text-align': 'center', 'margin-top': 40, 'margin-bottom':
+                           10}),
+        ]),
+
+        html.Div(className='row', children=[
+            html.H4("Made by Aarush Gupta and Shikhar Ahuja",
+                    style={'text-align': 'center', 'margin-top': 0, 'margin-bottom':
+                           20}),
+        ]),
+
+        html.Hr(),
+
+        html.Div(className='row', children=[
+
+            html.Div(className="four columns", children=[
+                 html.Button('Switch Graph View',
+                             id='us_line_graph_button', n_clicks=0)
+                 ], style={'margin-top': 30, 'text-align': 'center', 'color': 'white'}),
+
+            html.Div(className="seven columns", children=[
+                html.P("\nThis graph represents the number of cases of COVID-19 in the U.S. as a function of days after January 22, 2020. This data was collected by John Hopkins University and made freely available on GitHub. Toggle the button on the left to switch between graphs displaying data for states/provinces and totals for the United States. The states graphed are picked in the box below the button, or by the top states presets; with none picked, every state is shown.")
+            ])
+
+        ]),
+
+        html.Div(className='row', children=[
+            html.Div(className="three columns", children=[
+                dcc.RadioItems(id='us_metric', options=metric_options(data, 'us'),
+                               value='confirmed', labelStyle={'display': 'inline-block', 'margin-right': 20})
+            ]),
+            html.Div(className="three columns", children=[
+                dcc.RadioItems(id='us_top', options=top_options(),
+                               value=DEFAULT_TOP, labelStyle={'display': 'inline-block', 'margin-right': 20})
+            ]),
+            html.Div(className="six columns", children=[
+                dcc.Dropdown(id='us_locations', options=location_options(data, 'us'),
+                             value=figures['locations'], multi=True, placeholder='All states')
+            ]),
+        ], style={'margin-left': 50, 'margin-right': 50, 'margin-top': 20}),
+
+        html.Div(className='row', children=[
+            dcc.Graph(id='us_line_graph', figure=figures['line'],
+                      config={'displayModeBar': False}, animate=True)
+        ], style={'margin-left': 50, 'margin-right': 50}),
+
+        html.Div(className='row', children=[
+            html.P("The graph below plots the new daily cases versus the number of total cases at some point in time. Like for the graph above, click the button to toggle the graph data and click on a specific state to view its graph alone. Plotting the new cases versus total cases can help determine the type of growth of the curve. If points lie roughly along a straight line, this means that the number of new cases increases rapidly as the totals increase, which implies exponential growth. On the other hand, flat and declining curves imply constant and slowing growth, respectively. Due to the volatality of the graph, only a rough idea of the type of growth curve can be obtained.")
+        ], style={'margin': 50}),
+
+        html.Div(className='row', children=[
+            dcc.RadioItems(id='us_new_cases_mode',
+                           options=[{'label': 'Daily new cases', 'value': 'daily'},
+                                    {'label': '7-day average', 'value': 'smoothed'}],
+                           value='daily', labelStyle={'display': 'inline-block', 'margin-right': 20})
+        ], style={'margin-left': 50, 'margin-right': 50}),
+
+        html.Div(className='row', children=[
+            dcc.Graph(id='us_line_graph_2', figure=figures['line_2'],
+                      config={'displayModeBar': False}, animate=True)
+        ], style={'margin-left': 50, 'margin-right': 50}),
+
+        html.Div(className='row', children=[
+            html.Div(className="eight columns", children=[
+                html.Div(id='us_map_view', children=[
+                    dcc.Graph(id='us_map', figure=figures['map'], style={"height": 500},
+                              config={'displayModeBar': False})
+                ]),
+                html.Div(id='us_animation_view', style={'display': 'none'}, children=[
+                    dcc.Graph(id='us_animation', style={"height": 500},
+                              config={'displayModeBar': False})
+                ]),
+            ]),
+            html.Div(className="three columns", children=[
+                html.P(
+                     "This is a cloropleth map of COVID-19 cases in the United States. Note that the colors are scaled logarithmically so that differences are more visible. Move the slider below to change the day of the data the map is showing, or play a time-lapse of every day."),
+                html.Div(className="row", children=[
+                    dcc.Slider(
+                         id='us_day_slider',
+                         min=0,
+                         max=us_data.num_days - 1,
+                         step=1,
+                         value=us_data.num_days - 1,
+                         ),
+                ], style={"margin-top": 50}),
+                dcc.Checklist(id='us_play', options=[{'label': ' Time-lapse of every day', 'value': 'play'}],
+                              value=[], style={"margin-top": 20})
+            ], style={"margin-top": 150})
+        ]),
+
+        html.Div(className='row', children=[
+            html.Div(children=[
+                 dcc.Graph(id='us_pie', figure=figures['pie'],
+                           config={'displayModeBar': False})
+                 ], className="six columns")
+        ]),
+
+        dcc.Store(id='us_day_matrix')
     ])
-])
-
-global_page = html.Div(children=[
-
-    html.Div(className='row', children=[
-        html.H1("Global COVID-19 Case Data",
-                style={'text-align': 'center', 'margin-top': 40, 'margin-bottom':
-                       10}),
-    ]),
-
-    html.Div(className='row', children=[
-        html.H4("Made by Aarush Gupta and Shikhar Ahuja",
-                style={'text-align': 'center', 'margin-top': 0, 'margin-bottom':
-                       20}),
-    ]),
-
-    html.Hr(),
-
-    html.Div(className='row', children=[
-
-        html.Div(className="four columns", children=[
-             html.Button('Switch Graph View',
-                         id='global_line_graph_button', n_clicks=0)
-             ], style={'margin-top': 30, 'text-align': 'center', 'color': 'white'}),
-
-        html.Div(className="seven columns", children=[
-            html.P("\nThis graph represents the number of cases of COVID-19 in the world as a function of days after January 22, 2020. This data was collected by John Hopkins University and made freely available on GitHub. Toggle the button on the left to switch between graphs displaying data for individual countries and global totals. To view data only for a specific country, double-click its name in the legend of the graph. You can also compare the data of two or more countries in this way as well.")
-        ])
-
-    ]),
-
-    html.Div(className='row', children=[
-        dcc.Graph(id='global_line_graph', config={'displayModeBar': False},
-                  animate=True)
-    ], style={'margin-left': 50, 'margin-right': 50}),
-
-    html.Div(className='row', children=[
-        html.P("The graph below plots the new daily cases versus the number of total cases at some point in time. Like for the graph above, click the button to toggle the graph data and click on a specific state to view its graph alone. Plotting the new cases versus total cases can help determine the type of growth of the curve. If points lie roughly along a straight line, this means that the number of new cases increases rapidly as the totals increase, which implies exponential growth. On the other hand, flat and declining curves imply constant and slowing growth, respectively. Due to the volatality of the graph, only a rough idea of the type of growth curve can be obtained.")
-    ], style={'margin': 50}),
-
-    html.Div(className='row', children=[
-        dcc.Graph(id='global_line_graph_2', config={'displayModeBar': False},
-                  animate=True)
-    ], style={'margin-left': 50, 'margin-right': 50}),
-
-    html.Div(className='row', children=[
-        html.Div(className="eight columns", children=[
-             dcc.Graph(id='global_map', style={"height": 500},
-                       config={'displayModeBar': False})
-             ]),
-        html.Div(className="three columns", children=[
-            html.P(
-                 "This is a cloropleth map of global COVID-19 cases. Note that the colors are scaled logarithmically so that differences are more visible. Move the slider below to change the day of the data the map is showing."),
-            html.Div(className="row", children=[
-                dcc.Slider(
-                     id='global_day_slider',
-                     min=0,
-                     max=us_time_series.shape[1] - 3,
-                     step=1,
-                     value=us_time_series.shape[1] - 3,
-                     ),
-            ], style={"margin-top": 50})
-        ], style={"margin-top": 150})
-    ]),
-
-    html.Div(className='row', children=[
-        html.Div(children=[
-             dcc.Graph(id='global_pie', config={'displayModeBar': False})
-             ], className="six columns")
+
+
+def global_page(data):
+    global_data = data['global']
+    figures = initial_figures(data, 'global')
+
+    return html.Div(children=[
+
+        html.Div(className='row', children=[
+            html.H1("Global COVID-19 Case Data",
+                    style={'text-align': 'center', 'margin-top': 40, 'margin-bottom':
+                           10}),
+        ]),
+
+        html.Div(className='row', children=[
+            html.H4("Made by Aarush Gupta and Shikhar Ahuja",
+                    style={'text-align': 'center', 'margin-top': 0, 'margin-bottom':
+                           20}),
+        ]),
+
+        html.Hr(),
+
+        html.Div(className='row', children=[
+
+            html.Div(className="four columns", children=[
+                 html.Button('Switch Graph View',
+                             id='global_line_graph_button', n_clicks=0)
+                 ], style={'margin-top': 30, 'text-align': 'center', 'color': 'white'}),
+
+            html.Div(className="seven columns", children=[
+                html.P("\nThis graph represents the number of cases of COVID-19 in the world as a function of days after January 22, 2020. This data was collected by John Hopkins University and made freely available on GitHub. Toggle the button on the left to switch between graphs displaying data for individual countries and global totals. The countries graphed are picked in the box below the button, or by the top countries presets; with none picked, every country is shown.")
+            ])
+
+        ]),
+
+        html.Div(className='row', children=[
+            html.Div(className="three columns", children=[
+                dcc.RadioItems(id='global_metric', options=metric_options(data, 'global'),
+                               value='confirmed', labelStyle={'display': 'inline-block', 'margin-right': 20})
+            ]),
+            html.Div(className="three columns", children=[
+                dcc.RadioItems(id='global_top', options=top_options(),
+                               value=DEFAULT_TOP, labelStyle={'display': 'inline-block', 'margin-right': 20})
+            ]),
+            html.Div(className="six columns", children=[
+                dcc.Dropdown(id='global_locations', options=location_options(data, 'global'),
+                             value=figures['locations'], multi=True, placeholder='All countries')
+            ]),
+        ], style={'margin-left': 50, 'margin-right': 50, 'margin-top': 20}),
+
+        html.Div(className='row', children=[
+            dcc.Graph(id='global_line_graph', figure=figures['line'],
+                      config={'displayModeBar': False}, animate=True)
+        ], style={'margin-left': 50, 'margin-right': 50}),
+
+        html.Div(className='row', children=[
+            html.P("The graph below plots the new daily cases versus the number of total cases at some point in time. Like for the graph above, click the button to toggle the graph data and click on a specific state to view its graph alone. Plotting the new cases versus total cases can help determine the type of growth of the curve. If points lie roughly along a straight line, this means that the number of new cases increases rapidly as the totals increase, which implies exponential growth. On the other hand, flat and declining curves imply constant and slowing growth, respectively. Due to the volatality of the graph, only a rough idea of the type of growth curve can be obtained.")
+        ], style={'margin': 50}),
+
+        html.Div(className='row', children=[
+            dcc.RadioItems(id='global_new_cases_mode',
+                           options=[{'label': 'Daily new cases', 'value': 'daily'},
+                                    {'label': '7-day average', 'value': 'smoothed'}],
+                           value='daily', labelStyle={'display': 'inline-block', 'margin-right': 20})
+        ], style={'margin-left': 50, 'margin-right': 50}),
+
+        html.Div(className='row', children=[
+            dcc.Graph(id='global_line_graph_2', figure=figures['line_2'],
+                      config={'displayModeBar': False}, animate=True)
+        ], style={'margin-left': 50, 'margin-right': 50}),
+
+        html.Div(className='row', children=[
+            html.Div(className="eight columns", children=[
+                html.Div(id='global_map_view', children=[
+                    dcc.Graph(id='global_map', figure=figures['map'], style={"height": 500},
+                              config={'displayModeBar': False})
+                ]),
+                html.Div(id='global_animation_view', style={'display': 'none'}, children=[
+                    dcc.Graph(id='global_animation', style={"height": 500},
+                              config={'displayModeBar': False})
+                ]),
+            ]),
+            html.Div(className="three columns", children=[
+                html.P(
+                     "This is a cloropleth map of global COVID-19 cases. Note that the colors are scaled logarithmically so that differences are more visible. Move the slider below to change the day of the data the map is showing, or play a time-lapse of every day."),
+                html.Div(className="row", children=[
+                    dcc.Slider(
+                         id='global_day_slider',
+                         min=0,
+                         max=global_data.num_days - 1,
+                         step=1,
+                         value=global_data.num_days - 1,
+                         ),
+                ], style={"margin-top": 50}),
+                dcc.Checklist(id='global_play', options=[{'label': ' Time-lapse of every day', 'value': 'play'}],
+                              value=[], style={"margin-top": 20})
+            ], style={"margin-top": 150})
+        ]),
+
+        html.Div(className='row', children=[
+            html.Div(children=[
+                 dcc.Graph(id='global_pie', figure=figures['pie'],
+                           config={'displayModeBar': False})
+                 ], className="six columns")
+        ]),
+
+        dcc.Store(id='global_day_matrix')
     ])
-])
 
 #### CALLBACKS ####
 
 
+def top_options():
+    return ([{'label': 'Top %d' % n, 'value': n} for n in TOP_PRESETS]
+            + [{'label': 'All', 'value': 0}])
+
+
+def location_options(data, region):
+    return [{'label': name, 'value': name} for name in data[region].names]
+
+
+def top_locations(data, region, top, metric):
+    # The preset fills in the picker, which can then be edited
+    if not top:
+        return []
+    matrix = data[metric_scope(data, region, metric)]
+    return matrix.names[matrix.top(top)].tolist()
+
+
+def selected_rows(matrix, locations):
+    """Rows of the picked locations, or all of them when none are picked."""
+    if not locations:
+        return slice(None)
+    return matrix.rows(locations)
+
+
+def metric_scope(data, region, metric):
+    # A metric missing from the data falls back to confirmed cases
+    scope = dataset.scope_name(region, metric)
+    return scope if scope in data.scopes else region
+
+
+def new_case_rows(series, mode):
+    return series.new_avg if mode == 'smoothed' else series.new
+
+
+def location_traces(x, y, names, width, x_range=None):
+    """One WebGL trace per location, downsampled to the width of the graph."""
+    # The graphs sit inside 50px margins on both sides
+    width = (width or DEFAULT_WIDTH) - 100
+    n_out = max(100, int(width * POINTS_PER_PIXEL))
+    rows = downsample.downsample_rows(x, y, n_out, x_range)
+    return [go.Scattergl(x=xs, y=ys, mode='lines', name=name)
+            for name, (xs, ys) in zip(names, rows)]
+
+
+def zoom_range(relayout):
+    if not relayout:
+        return None
+    if 'xaxis.range[0]' in relayout:
+        return relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    if 'xaxis.range' in relayout:
+        return tuple(relayout['xaxis.range'])
+    return None
+
+
+def is_zoom(relayout):
+    return any(key.startswith(('xaxis.range', 'xaxis.autorange'))
+               for key in (relayout or {}))
+
+
+def triggered_ids():
+    # Callbacks are also called directly, outside of any Dash callback, e.g.
+    # for the initial figures while the layout request is served
+    if not flask.has_request_context():
+        return []
+    try:
+        return [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    except (MissingCallbackContextException, LookupError):
+        return []
+
+
+def pie_slices(locations, cases, total, threshold=PIE_THRESHOLD):
+    # Locations under `threshold` of the day's total are merged into "Other"
+    small = cases < threshold * total
+    if not small.any():
+        return locations, cases
+    names = np.append(locations[~small], 'Other')
+    values = np.append(cases[~small], cases[small].sum())
+    return names, values
+
+
 @app.callback(
-    Output(component_id='tab-content', component_property='children'),
-    [Input(component_id='tabs', component_property='value')]
+    Output(component_id='dataset_version', component_property='data'),
+    [Input(component_id='version_check', component_property='n_intervals')],
+    [State(component_id='dataset_version', component_property='data')],
+    prevent_initial_call=True
 )
-def return_content(val):
-    if val == 'tab-1':
-        return us_page
-    else:
-        return global_page
+def check_version(n_intervals, version):
+    if store.current.version == version:
+        raise PreventUpdate
+    return store.current.version
+
+
+def follow_new_days(scope, slider_val, slider_max):
+    # Sliders resting on the latest day move along with the data
+    num_days = store.current[scope].num_days
+    if slider_max == num_days - 1:
+        raise PreventUpdate
+    if slider_val == slider_max:
+        slider_val = num_days - 1
+    return num_days - 1, slider_val
+
+
+@app.callback(
+    Output(component_id='us_locations', component_property='value'),
+    [Input(component_id='us_top', component_property='value')],
+    [State(component_id='us_metric', component_property='value')],
+    prevent_initial_call=True
+)
+def us_top_locations(top, metric='confirmed'):
+    return top_locations(store.current, 'us', top, metric)
+
+
+@app.callback(
+    Output(component_id='global_locations', component_property='value'),
+    [Input(component_id='global_top', component_property='value')],
+    [State(component_id='global_metric', component_property='value')],
+    prevent_initial_call=True
+)
+def global_top_locations(top, metric='confirmed'):
+    return top_locations(store.current, 'global', top, metric)
+
+
+@app.callback(
+    [Output(component_id='us_day_slider', component_property='max'),
+     Output(component_id='us_day_slider', component_property='value')],
+    [Input(component_id='dataset_version', component_property='data')],
+    [State(component_id='us_day_slider', component_property='value'),
+     State(component_id='us_day_slider', component_property='max')],
+    prevent_initial_call=True
+)
+def us_slider_range(version, slider_val, slider_max):
+    return follow_new_days('us', slider_val, slider_max)
+
+
+@app.callback(
+    [Output(component_id='global_day_slider', component_property='max'),
+     Output(component_id='global_day_slider', component_property='value')],
+    [Input(component_id='dataset_version', component_property='data')],
+    [State(component_id='global_day_slider', component_property='value'),
+     State(component_id='global_day_slider', component_property='max')],
+    prevent_initial_call=True
+)
+def global_slider_range(version, slider_val, slider_max):
+    return follow_new_days('global', slider_val, slider_max)
 
 
 @ app.callback(
     [Output(component_id='us_line_graph', component_property='figure'), Output(
         component_id='us_line_graph_2', component_property='figure')],
-    [Input(component_id='us_line_graph_button', component_property='n_clicks')]
+    [Input(component_id='us_line_graph_button', component_property='n_clicks'),
+     Input(component_id='us_new_cases_mode', component_property='value'),
+     Input(component_id='us_metric', component_property='value'),
+     Input(component_id='us_locations', component_property='value'),
+     Input(component_id='dataset_version', component_property='data'),
+     Input(component_id='us_line_graph', component_property='relayoutData'),
+     Input(component_id='us_line_graph_2', component_property='relayoutData')],
+    [State(component_id='viewport_width', component_property='data')],
+    prevent_initial_call=True
 )
-def us_line_graphs(n_clicks):
+def us_line_graphs(n_clicks, new_cases_mode='daily', metric='confirmed', locations=None, version=None,
+                   relayout=None, relayout_2=None, width=None, data=None):
+    # `data` is only passed outside callbacks, e.g. to draw a given dataset
+    if data is None:
+        data = store.current
+    scope = metric_scope(data, 'us', metric)
+    us_data = data[scope]
+    label = METRIC_LABELS[dataset.split_scope(scope)[1]]
     fig = go.Figure()
     fig2 = go.Figure()
 
-    if n_clicks % 2 == 0:
-        fig.add_trace(go.Scatter(x=np.arange(len(us_totals)),
-                                 y=us_totals, mode='lines+markers', name='Cases in the US'))
-
-        new_cases = []
-        for i in range(len(us_totals)):
-            if i == 0:
-                new_cases.append(us_totals[0])
-            else:
-                new_cases.append(us_totals[i] - us_totals[i-1])
-
-        fig2.add_trace(go.Scatter(x=us_totals,
-                                  y=new_cases, mode='lines+markers', name='Cases in the US'))
+    # Zooming the per-location view re-renders only the zoomed graph, at
+    # full resolution for the visible range
+    triggered = triggered_ids()
+    zoomed = triggered == ['us_line_graph.relayoutData']
+    zoomed_2 = triggered == ['us_line_graph_2.relayoutData']
+    if zoomed or zoomed_2:
+        if n_clicks % 2 == 0 or not is_zoom(relayout if zoomed else relayout_2):
+            raise PreventUpdate
+    x_range = zoom_range(relayout) if zoomed else None
+    x_range_2 = zoom_range(relayout_2) if zoomed_2 else None
 
-        title1 = "Total COVID-19 Cases in the United States vs. Days since Jan. 20, 2022"
-        title2 = "New COVID-19 Cases in the United States vs. Total Cases"
+    if n_clicks % 2 == 0:
+        new_cases = new_case_rows(us_data.derived_totals, new_cases_mode)[0]
+        fig.add_trace(go.Scatter(x=np.arange(us_data.num_days),
+                                 y=us_data.totals, mode='lines+markers', name='%s in the US' % label))
+        fig2.add_trace(go.Scatter(x=us_data.totals,
+                                  y=new_cases, mode='lines+markers', name='%s in the US' % label))
+
+        title1 = "Total COVID-19 %s in the United States vs. Days since Jan. 20, 2022" % label
+        title2 = "New COVID-19 %s in the United States vs. Total %s" % (label, label)
     else:
-        for loc in us_time_series['Province_State'].to_list():
-            y_list = us_time_series[us_time_series['Province_State'] == loc].transpose()[
-                2:].squeeze().to_list()
-            fig.add_trace(go.Scatter(x=np.arange(len(y_list)),
-                                     y=y_list, mode='lines+markers', name=loc))
-
-            new_cases = []
-            for i in range(len(us_totals)):
-                if i == 0:
-                    new_cases.append(y_list[0])
-                else:
-                    new_cases.append(y_list[i] - y_list[i-1])
-
-            fig2.add_trace(go.Scatter(x=y_list,
-                                      y=new_cases, mode='lines+markers', name=loc))
-
-        title1 = "COVID-19 Cases in States and Provinces"
-        title2 = "New COVID-19 Cases vs. Total Cases in States and Provinces"
+        rows = selected_rows(us_data, locations)
+        counts = us_data.counts[rows]
+        names = us_data.names[rows]
+        new_cases = new_case_rows(us_data.derived, new_cases_mode)[rows]
+        if not zoomed_2:
+            fig.add_traces(location_traces(np.arange(us_data.num_days), counts,
+                                           names, width, x_range))
+        if not zoomed:
+            fig2.add_traces(location_traces(counts, new_cases, names, width, x_range_2))
+
+        title1 = "COVID-19 %s in States and Provinces" % label
+        title2 = "New COVID-19 %s vs. Total %s in States and Provinces" % (label, label)
 
     fig.update_layout(title=title1,
                       xaxis_title='Days since Jan. 22, 2020',
-                      yaxis_title='Number of Cases', template='plotly_dark', hovermode='x unified', hoverlabel=dict(
+                      yaxis_title='Number of %s' % label, template='plotly_dark', hovermode='x unified', hoverlabel=dict(
                           bgcolor="black",
                           font_size=11,
                           font_family="Rockwell",
@@ -316,65 +543,86 @@ def us_line_graphs(n_clicks):
                       ))
 
     fig2.update_layout(title=title2,
-                       xaxis_title='Number of Cases',
-                       yaxis_title='Number of New Cases', template='plotly_dark', hovermode='x unified', hoverlabel=dict(
+                       xaxis_title='Number of %s' % label,
+                       yaxis_title='Number of New %s' % label, template='plotly_dark', hovermode='x unified', hoverlabel=dict(
                            bgcolor="black",
                            font_size=11,
                            font_family="Rockwell",
                            font_color="white"
                        ))
 
-    return fig, fig2
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    if x_range_2 is not None:
+        fig2.update_xaxes(range=list(x_range_2))
+    if zoomed:
+        return figure_encoding.compact_figure(fig), dash.no_update
+    if zoomed_2:
+        return dash.no_update, figure_encoding.compact_figure(fig2)
+    return figure_encoding.compact_figure(fig), figure_encoding.compact_figure(fig2)
 
 
 @ app.callback(
     [Output(component_id='global_line_graph', component_property='figure'), Output(
         component_id='global_line_graph_2', component_property='figure')],
-    [Input(component_id='global_line_graph_button', component_property='n_clicks')]
+    [Input(component_id='global_line_graph_button', component_property='n_clicks'),
+     Input(component_id='global_new_cases_mode', component_property='value'),
+     Input(component_id='global_metric', component_property='value'),
+     Input(component_id='global_locations', component_property='value'),
+     Input(component_id='dataset_version', component_property='data'),
+     Input(component_id='global_line_graph', component_property='relayoutData'),
+     Input(component_id='global_line_graph_2', component_property='relayoutData')],
+    [State(component_id='viewport_width', component_property='data')],
+    prevent_initial_call=True
 )
-def global_line_graphs(n_clicks):
+def global_line_graphs(n_clicks, new_cases_mode='daily', metric='confirmed', locations=None, version=None,
+                   relayout=None, relayout_2=None, width=None, data=None):
+    # `data` is only passed outside callbacks, e.g. to draw a given dataset
+    if data is None:
+        data = store.current
+    scope = metric_scope(data, 'global', metric)
+    global_data = data[scope]
+    label = METRIC_LABELS[dataset.split_scope(scope)[1]]
     fig = go.Figure()
     fig2 = go.Figure()
 
-    if n_clicks % 2 == 0:
-        fig.add_trace(go.Scatter(x=np.arange(len(global_totals)),
-                                 y=global_totals, mode='lines+markers', name='Cases in the World'))
-
-        new_cases = []
-        for i in range(len(us_totals)):
-            if i == 0:
-                new_cases.append(global_totals[0])
-            else:
-                new_cases.append(global_totals[i] - global_totals[i-1])
-
-        fig2.add_trace(go.Scatter(x=global_totals,
-                                  y=new_cases, mode='lines+markers', name='Cases in the World'))
+    # Zooming the per-location view re-renders only the zoomed graph, at
+    # full resolution for the visible range
+    triggered = triggered_ids()
+    zoomed = triggered == ['global_line_graph.relayoutData']
+    zoomed_2 = triggered == ['global_line_graph_2.relayoutData']
+    if zoomed or zoomed_2:
+        if n_clicks % 2 == 0 or not is_zoom(relayout if zoomed else relayout_2):
+            raise PreventUpdate
+    x_range = zoom_range(relayout) if zoomed else None
+    x_range_2 = zoom_range(relayout_2) if zoomed_2 else None
 
-        title1 = "Total COVID-19 Cases in the World"
-        title2 = "New COVID-19 Cases in the World vs. Total Cases"
+    if n_clicks % 2 == 0:
+        new_cases = new_case_rows(global_data.derived_totals, new_cases_mode)[0]
+        fig.add_trace(go.Scatter(x=np.arange(global_data.num_days),
+                                 y=global_data.totals, mode='lines+markers', name='%s in the World' % label))
+        fig2.add_trace(go.Scatter(x=global_data.totals,
+                                  y=new_cases, mode='lines+markers', name='%s in the World' % label))
+
+        title1 = "Total COVID-19 %s in the World" % label
+        title2 = "New COVID-19 %s in the World vs. Total %s" % (label, label)
     else:
-        for loc in global_time_series['Country/Region'].to_list():
-            y_list = global_time_series[global_time_series['Country/Region'] == loc].transpose()[
-                2:].squeeze().to_list()
-            fig.add_trace(go.Scatter(x=np.arange(len(y_list)),
-                                     y=y_list, mode='lines+markers', name=loc))
-
-            new_cases = []
-            for i in range(len(global_totals)):
-                if i == 0:
-                    new_cases.append(y_list[0])
-                else:
-                    new_cases.append(y_list[i] - y_list[i-1])
-
-            fig2.add_trace(go.Scatter(x=y_list,
-                                      y=new_cases, mode='lines+markers', name=loc))
-
-        title1 = "COVID-19 Cases in Countries"
-        title2 = "New COVID-19 Cases vs. Total Cases in Countries"
+        rows = selected_rows(global_data, locations)
+        counts = global_data.counts[rows]
+        names = global_data.names[rows]
+        new_cases = new_case_rows(global_data.derived, new_cases_mode)[rows]
+        if not zoomed_2:
+            fig.add_traces(location_traces(np.arange(global_data.num_days), counts,
+                                           names, width, x_range))
+        if not zoomed:
+            fig2.add_traces(location_traces(counts, new_cases, names, width, x_range_2))
+
+        title1 = "COVID-19 %s in Countries" % label
+        title2 = "New COVID-19 %s vs. Total %s in Countries" % (label, label)
 
     fig.update_layout(title=title1,
                       xaxis_title='Days',
-                      yaxis_title='Number of Cases', template='plotly_dark', hovermode='x unified', hoverlabel=dict(
+                      yaxis_title='Number of %s' % label, template='plotly_dark', hovermode='x unified', hoverlabel=dict(
                           bgcolor="black",
                           font_size=11,
                           font_family="Rockwell",
@@ -382,48 +630,48 @@ def global_line_graphs(n_clicks):
                       ))
 
     fig2.update_layout(title=title2,
-                       xaxis_title='Number of Cases',
-                       yaxis_title='Number of New Cases', template='plotly_dark', hovermode='x unified', hoverlabel=dict(
+                       xaxis_title='Number of %s' % label,
+                       yaxis_title='Number of New %s' % label, template='plotly_dark', hovermode='x unified', hoverlabel=dict(
                            bgcolor="black",
                            font_size=11,
                            font_family="Rockwell",
                            font_color="white"
                        ))
 
-    return fig, fig2
-
-
-@ app.callback(
-    [Output(component_id='us_map', component_property='figure'),
-     Output(component_id='us_pie', component_property='figure')],
-    [Input(component_id='us_day_slider', component_property='value')]
-)
-def us_map(slider_val):
-    loc_cases = pd.DataFrame(
-        columns=["Location", "Number of Cases", "Log Number of Cases"])
-    for loc in us_time_series['Province_State']:
-        if loc in us_state_abbrev.keys():
-            log_val = log(us_time_series[us_time_series['Province_State'] == loc].transpose()[
-                2:].squeeze().to_list()[slider_val])/log(10) if us_time_series[us_time_series['Province_State'] == loc].transpose()[
-                2:].squeeze().to_list()[slider_val] != 0 else 0
-            loc_cases = loc_cases.append(
-                {"Location": us_state_abbrev[loc], "Number of Cases": us_time_series[us_time_series['Province_State'] == loc].transpose()[
-                    2:].squeeze().to_list()[slider_val], "Log Number of Cases": log_val}, ignore_index=True)
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    if x_range_2 is not None:
+        fig2.update_xaxes(range=list(x_range_2))
+    if zoomed:
+        return figure_encoding.compact_figure(fig), dash.no_update
+    if zoomed_2:
+        return dash.no_update, figure_encoding.compact_figure(fig2)
+    return figure_encoding.compact_figure(fig), figure_encoding.compact_figure(fig2)
+
+
+def render_us_map(us_data, slider_val, label='Cases'):
+    slider_val = min(slider_val, us_data.num_days - 1)
+    mapped = us_data.mapped
+    locations = us_data.codes[mapped]
+    names = us_data.names[mapped]
+    cases = us_data.day(slider_val)[mapped]
+    log_cases = us_data.log_day(slider_val)[mapped]
 
     fig = go.Figure(data=go.Choropleth(
-        locations=loc_cases['Location'],  # Spatial coordinates
-        z=loc_cases['Log Number of Cases'].astype(
-            float),  # Data to be color-coded
+        locations=locations,  # Spatial coordinates
+        z=log_cases,  # Data to be color-coded
+        text=names,
+        hoverinfo='text+z',
         locationmode='USA-states',
         colorbar=dict(len=1,
-                      title='Number of Cases (Logarithmic)',
+                      title='Number of %s (Logarithmic)' % label,
                       x=0.9,
                       tickvals=[0, 1, 2, 3, 4, 5, 6],
                       ticktext=['0', '10', '100', '1000', '10000', '100000', '1000000'])
     ),)
 
     fig.update_layout(
-        title_text='Map of COVID-19 Cases in the U.S.',  # Create a Title
+        title_text='Map of COVID-19 %s in the U.S.' % label,  # Create a Title
         geo_scope='usa',  # Plot only the USA instead of globe
         template='plotly_dark', hoverlabel=dict(
             bgcolor="white",
@@ -433,41 +681,33 @@ def us_map(slider_val):
         )
     )
 
-    loc_cases.loc[loc_cases['Number of Cases'] /
-                  us_totals[slider_val] < 0.02, 'Location'] = 'Other'
-    return fig, px.pie(loc_cases, values='Number of Cases', names='Location', template='plotly_dark', color_discrete_sequence=px.colors.sequential.Inferno)
+    labels, values = pie_slices(names, cases, us_data.totals[slider_val])
+    return fig, px.pie(values=values, names=labels, template='plotly_dark', color_discrete_sequence=px.colors.sequential.Inferno)
 
 
-@ app.callback(
-    [Output(component_id='global_map', component_property='figure'),
-     Output(component_id='global_pie', component_property='figure')],
-    [Input(component_id='global_day_slider', component_property='value')]
-)
-def global_map(slider_val):
-    loc_cases = pd.DataFrame(
-        columns=["Location", "Number of Cases", "Log Number of Cases"])
-    for loc in global_time_series['Country/Region']:
-        log_val = log(global_time_series[global_time_series['Country/Region'] == loc].transpose()[
-            2:].squeeze().to_list()[slider_val])/log(10) if global_time_series[global_time_series['Country/Region'] == loc].transpose()[
-            2:].squeeze().to_list()[slider_val] != 0 else 0
-        loc_cases = loc_cases.append(
-            {"Location": loc, "Number of Cases": global_time_series[global_time_series['Country/Region'] == loc].transpose()[
-                2:].squeeze().to_list()[slider_val], "Log Number of Cases": log_val}, ignore_index=True)
+def render_global_map(global_data, slider_val, label='Cases'):
+    slider_val = min(slider_val, global_data.num_days - 1)
+    mapped = global_data.mapped
+    locations = global_data.codes[mapped]
+    names = global_data.names[mapped]
+    cases = global_data.day(slider_val)[mapped]
+    log_cases = global_data.log_day(slider_val)[mapped]
 
     fig = go.Figure(data=go.Choropleth(
-        locations=loc_cases['Location'],  # Spatial coordinates
-        z=loc_cases['Log Number of Cases'].astype(
-            float),  # Data to be color-coded
-        locationmode='country names',
+        locations=locations,  # Spatial coordinates
+        z=log_cases,  # Data to be color-coded
+        text=names,
+        hoverinfo='text+z',
+        locationmode='ISO-3',
         colorbar=dict(len=1,
-                      title='Number of Cases (Logarithmic)',
+                      title='Number of %s (Logarithmic)' % label,
                       x=0.9,
                       tickvals=[0, 1, 2, 3, 4, 5, 6],
                       ticktext=['0', '10', '100', '1000', '10000', '100000', '1000000'])
     ),)
 
     fig.update_layout(
-        title_text='Map of COVID-19 Cases in the World',  # Create a Title
+        title_text='Map of COVID-19 %s in the World' % label,  # Create a Title
         geo_scope='world',  # Plot only the USA instead of globe
         template='plotly_dark', hoverlabel=dict(
             bgcolor="white",
@@ -477,10 +717,269 @@ def global_map(slider_val):
         )
     )
 
-    loc_cases.loc[loc_cases['Number of Cases'] /
-                  global_totals[slider_val] < 0.02, 'Location'] = 'Other'
-    return fig, px.pie(loc_cases, values='Number of Cases', names='Location', template='plotly_dark', color_discrete_sequence=px.colors.sequential.Inferno)
+    labels, values = pie_slices(names, cases, global_data.totals[slider_val])
+    return fig, px.pie(values=values, names=labels, template='plotly_dark', color_discrete_sequence=px.colors.sequential.Inferno)
+
+
+def map_renderer(scope):
+    """The render function for `scope` and its metric label."""
+    region, metric = dataset.split_scope(scope)
+    render = render_us_map if region == 'us' else render_global_map
+    return functools.partial(render, label=METRIC_LABELS[metric])
+
+
+def map_templates(matrix, render):
+    """The map and pie of `matrix` as JSON, with their data arrays left
+    empty to be filled in for any day."""
+    fig, pie = render(matrix, matrix.num_days - 1)
+    fig.update_traces(locations=[], text=[], z=[])
+    pie.update_traces(labels=[], values=[])
+    return fig.to_plotly_json(), pie.to_plotly_json()
+
+
+def fill_map_templates(templates, matrix, day):
+    """The map and pie for `day` as the render functions draw them, from
+    map_templates() (assets/clientside.js does the same in the browser)."""
+    fig, pie = templates
+    mapped = matrix.mapped
+    names = matrix.names[mapped]
+    labels, values = pie_slices(names, matrix.day(day)[mapped], matrix.totals[day])
+    return (dict(fig, data=[dict(fig['data'][0], locations=matrix.codes[mapped], text=names,
+                                 z=matrix.log_day(day)[mapped])]),
+            dict(pie, data=[dict(pie['data'][0], labels=labels, values=values)]))
+
+
+def day_matrix_payload(data, scope, render):
+    """Everything the browser needs to draw the map and pie for any day."""
+    matrix = data[scope]
+    fig, pie = map_templates(matrix, render)
+    return {
+        'version': data.version,
+        'codes': matrix.codes[matrix.mapped].tolist(),
+        'names': matrix.names[matrix.mapped].tolist(),
+        'counts': matrix.counts[matrix.mapped].T.tolist(),
+        'totals': matrix.totals.tolist(),
+        'threshold': PIE_THRESHOLD,
+        'map': fig,
+        'pie': pie,
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def cached_day_matrix_payload(data, scope):
+    return day_matrix_payload(data, scope, map_renderer(scope))
+
+
+map_cache = figure_cache.FigureCache(current_version=lambda: store.current.version)
+
+
+def map_job(data, scope, slider_val):
+    day = min(slider_val, data[scope].num_days - 1)
+    return (scope, day), functools.partial(map_renderer(scope), data[scope], day)
+
+
+def cached_map(data, scope, slider_val):
+    key, render = map_job(data, scope, slider_val)
+    return map_cache.get(data.version, key, render)
+
+
+def us_map(slider_val, metric='confirmed'):
+    data = store.current
+    return cached_map(data, metric_scope(data, 'us', metric), slider_val)
+
+
+def global_map(slider_val, metric='confirmed'):
+    data = store.current
+    return cached_map(data, metric_scope(data, 'global', metric), slider_val)
+
+
+def animation_levels(matrix, step=ANIMATION_STEP):
+    """The days of the time-lapse, every `step` days up to the latest, and
+    the quantized log counts of the mapped locations on them, as a
+    (locations, days) array computed in one pass."""
+    days = np.arange(matrix.num_days - 1, -1, -max(step, 1))[::-1]
+    counts = matrix.counts[np.ix_(matrix.mapped, days)]
+    logs = np.zeros(counts.shape, dtype=np.float32)
+    np.log10(counts, out=logs, where=counts > 0)
+    levels = np.minimum(np.rint(logs * LEVELS_PER_DECADE), 255).astype(np.uint8)
+    return days, levels
+
+
+def render_animation(matrix, render, step=ANIMATION_STEP):
+    """The map of `matrix` as a time-lapse the browser plays by itself.
+
+    The frames only carry the new z values of the map, one byte per
+    location; locations, colors and layout are sent once.
+    """
+    days, levels = animation_levels(matrix, step)
+    fig, _ = render(matrix, int(days[0]))
+    tickvals = [tick * LEVELS_PER_DECADE for tick in fig.data[0].colorbar.tickvals]
+    fig.update_traces(zmin=0, zmax=max(int(levels.max()), 1), colorbar_tickvals=tickvals,
+                      hovertemplate='%{text}<extra></extra>')
+    fig.update_layout(updatemenus=[dict(
+        type='buttons', direction='left', x=0.1, y=0, xanchor='right', yanchor='top',
+        buttons=[
+            dict(label='Play', method='animate',
+                 args=[None, {'frame': {'duration': ANIMATION_FRAME_MS, 'redraw': True},
+                              'transition': {'duration': 0}, 'fromcurrent': True}]),
+            dict(label='Pause', method='animate',
+                 args=[[None], {'frame': {'duration': 0, 'redraw': False},
+                                'mode': 'immediate'}]),
+        ])])
+
+    figure = figure_encoding.compact_figure(fig)
+    figure['data'][0]['z'] = figure_encoding.typed_array(levels[:, 0])
+    names = [matrix.dates[day] for day in days]
+    # Built as plain dicts: validating hundreds of frames and slider steps
+    # through plotly's classes would take longer than computing them
+    figure['frames'] = [{'name': name, 'traces': [0],
+                         'data': [{'z': figure_encoding.typed_array(levels[:, i])}]}
+                        for i, name in enumerate(names)]
+    figure['layout']['sliders'] = [{
+        'active': 0, 'x': 0.1, 'len': 0.9, 'pad': {'t': 10},
+        'currentvalue': {'visible': True},
+        'steps': [{'label': name, 'method': 'animate',
+                   'args': [[name], {'frame': {'duration': 0, 'redraw': True},
+                                     'mode': 'immediate'}]}
+                  for name in names],
+    }]
+    return figure
+
+
+def map_animation(region, play, metric):
+    # Returns the animation and the styles that swap it in for the map
+    if not play:
+        return dash.no_update, {}, {'display': 'none'}
+    data = store.current
+    scope = metric_scope(data, region, metric)
+    render = functools.partial(render_animation, data[scope], map_renderer(scope))
+    return map_cache.get(data.version, (scope, 'animation'), render), {'display': 'none'}, {}
+
+
+@app.callback(
+    [Output(component_id='us_animation', component_property='figure'),
+     Output(component_id='us_map_view', component_property='style'),
+     Output(component_id='us_animation_view', component_property='style')],
+    [Input(component_id='us_play', component_property='value'),
+     Input(component_id='us_metric', component_property='value'),
+     Input(component_id='dataset_version', component_property='data')],
+    prevent_initial_call=True
+)
+def us_animation(play, metric='confirmed', version=None):
+    return map_animation('us', play, metric)
+
+
+@app.callback(
+    [Output(component_id='global_animation', component_property='figure'),
+     Output(component_id='global_map_view', component_property='style'),
+     Output(component_id='global_animation_view', component_property='style')],
+    [Input(component_id='global_play', component_property='value'),
+     Input(component_id='global_metric', component_property='value'),
+     Input(component_id='dataset_version', component_property='data')],
+    prevent_initial_call=True
+)
+def global_animation(play, metric='confirmed', version=None):
+    return map_animation('global', play, metric)
+
+
+@functools.lru_cache(maxsize=4)
+def initial_figures(data, region):
+    """The figures a tab opens with, drawn once per dataset version."""
+    line_graphs = us_line_graphs if region == 'us' else global_line_graphs
+    line, line_2 = line_graphs(0, data=data)
+    map_figure, pie = cached_map(data, region, data[region].num_days - 1)
+    return {'line': line, 'line_2': line_2, 'map': map_figure, 'pie': pie,
+            'locations': top_locations(data, region, DEFAULT_TOP, 'confirmed')}
+
+
+def prewarm_maps(num_days=figure_cache.PREWARM_DAYS):
+    """Render the maps for the latest `num_days` days in the background."""
+    data = store.current
+    jobs = []
+    for scope in ('us', 'global'):
+        latest = data[scope].num_days - 1
+        for day in range(latest, max(latest - num_days, -1), -1):
+            jobs.append(map_job(data, scope, day))
+    return figure_cache.prewarm(map_cache, data.version, jobs)
+
+
+def us_day_matrix(version, metric='confirmed'):
+    data = store.current
+    return cached_day_matrix_payload(data, metric_scope(data, 'us', metric))
+
+
+def global_day_matrix(version, metric='confirmed'):
+    data = store.current
+    return cached_day_matrix_payload(data, metric_scope(data, 'global', metric))
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='viewport', function_name='width'),
+    Output(component_id='viewport_width', component_property='data'),
+    [Input(component_id='tabs', component_property='value')]
+)
+
+if CLIENTSIDE_MAPS:
+    # The day matrix is sent once per dataset version and slider moves are
+    # redrawn in the browser by assets/clientside.js
+    for scope, day_matrix in (('us', us_day_matrix), ('global', global_day_matrix)):
+        app.callback(
+            Output(component_id=scope + '_day_matrix', component_property='data'),
+            [Input(component_id='dataset_version', component_property='data'),
+             Input(component_id=scope + '_metric', component_property='value')]
+        )(day_matrix)
+
+        app.clientside_callback(
+            ClientsideFunction(namespace='maps', function_name='render'),
+            [Output(component_id=scope + '_map', component_property='figure'),
+             Output(component_id=scope + '_pie', component_property='figure')],
+            [Input(component_id=scope + '_day_slider', component_property='value'),
+             Input(component_id=scope + '_day_matrix', component_property='data')],
+            prevent_initial_call=True
+        )
+else:
+    for scope, render_map in (('us', us_map), ('global', global_map)):
+        app.callback(
+            [Output(component_id=scope + '_map', component_property='figure'),
+             Output(component_id=scope + '_pie', component_property='figure')],
+            [Input(component_id=scope + '_day_slider', component_property='value'),
+             Input(component_id=scope + '_metric', component_property='value')],
+            prevent_initial_call=True
+        )(render_map)
+
+    if figure_cache.PREWARM_DAYS > 0:
+        prewarm_maps()
+
+
+#### INSTRUMENTATION ####
+
+figure_cache_stats = metrics.registry.register(metrics.Gauge(
+    'covid_figure_cache', 'Map figure cache hits, misses and size.', labels=('stat',)))
+dataset_days = metrics.registry.register(metrics.Gauge(
+    'covid_dataset_days', 'Days in the current dataset.', labels=('scope', 'version')))
+
+
+def collect_metrics():
+    for stat, value in map_cache.stats().items():
+        if stat != 'version':
+            figure_cache_stats.set(value, stat=stat)
+    data = store.current
+    dataset_days.clear()
+    for scope, matrix in data.scopes.items():
+        dataset_days.set(matrix.num_days, scope=scope, version=data.version)
+
+
+metrics.registry.add_collector(collect_metrics)
+metrics.instrument(app)
+
+### JSON API ###
+
+api.register(app.server, store)
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['export']:
+        # Static export of every view, see export.py
+        import export
+        sys.exit(export.main(sys.modules[__name__], sys.argv[2:]))
     app.run_server(debug=True, host='0.0.0.0')
@@ -0,0 +1,203 @@
+"""Read-only JSON API over the data the dashboard shows.
+
+    GET /api/scopes
+    GET /api/series?scope=us&loc=NY,CA&from=2020-03-01&to=2020-06-30&metric=new
+
+`loc` takes location names or map codes (USPS or ISO-3), comma separated
+(all locations when left out), `from` and `to` are inclusive ISO dates and
+`metric` is 'cumulative' (the default) or one of the derived series: new,
+new_avg, growth, growth_avg, doubling. Series are columnar JSON, one list of values
+per location:
+
+    {"scope": "us", "metric": "new", "dates": ["2020-03-01", ...],
+     "locations": ["California", "New York"], "values": [[...], [...]]}
+
+Responses are sliced straight out of the arrays of the current Dataset
+and memoized per dataset version. Every response carries a strong ETag
+made of the dataset version and the query, so a request whose
+If-None-Match still matches gets a 304 before any data is touched.
+"""
+import functools
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import flask
+import numpy as np
+
+import derived
+
+SERIES = ('cumulative',) + derived.SERIES
+CACHE_SIZE = int(os.environ.get('COVID_API_CACHE_SIZE', 1024))
+# Floats are rounded so their JSON stays short
+DECIMALS = 4
+
+
+class QueryError(ValueError):
+    pass
+
+
+class ScopeIndex:
+    """Lookups for one scope of a Dataset: rows by name or code, and days
+    by date."""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.rows = dict(matrix.index)
+        for row, code in enumerate(matrix.codes):
+            if code is not None:
+                self.rows.setdefault(code, row)
+        days = [datetime.strptime(date, '%m/%d/%y') for date in matrix.dates]
+        self.dates = [day.strftime('%Y-%m-%d') for day in days]
+        self.days = np.array(days, dtype='datetime64[D]')
+
+    def locations(self, loc):
+        """Rows of the comma separated names or codes in `loc`.
+
+        Some names hold commas themselves ("Korea, South"), so the longest
+        run of parts that names a location wins.
+        """
+        if not loc:
+            return np.arange(len(self.matrix.names))
+        parts = loc.split(',')
+        rows = []
+        start = 0
+        while start < len(parts):
+            for end in range(len(parts), start, -1):
+                name = ','.join(parts[start:end]).strip()
+                if name in self.rows:
+                    rows.append(self.rows[name])
+                    break
+            else:
+                raise QueryError('Unknown location %r' % parts[start].strip())
+            start = end
+        return np.array(rows, dtype=np.intp)
+
+    def day_range(self, start, end):
+        """The slice of days from `start` to `end`, both ISO dates or ''."""
+        try:
+            first = np.searchsorted(self.days, np.datetime64(start or self.days[0], 'D'))
+            last = np.searchsorted(self.days, np.datetime64(end or self.days[-1], 'D'),
+                                   side='right')
+        except ValueError:
+            raise QueryError('Dates must be given as YYYY-MM-DD')
+        return slice(int(first), int(last))
+
+
+@functools.lru_cache(maxsize=16)
+def scope_index(data, scope):
+    try:
+        return ScopeIndex(data[scope])
+    except KeyError:
+        raise QueryError('Unknown scope %r, see /api/scopes' % scope)
+
+
+def series_values(matrix, metric):
+    if metric == 'cumulative':
+        return matrix.counts
+    if metric not in derived.SERIES:
+        raise QueryError('Unknown metric %r, one of: %s' % (metric, ', '.join(SERIES)))
+    return getattr(matrix.derived, metric)
+
+
+def to_json_lists(values):
+    """Nested lists of `values` with NaN and infinities as null."""
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    values = values.astype(np.float64).round(DECIMALS)
+    bad = ~np.isfinite(values)
+    if bad.any():
+        values = values.astype(object)
+        values[bad] = None
+    return values.tolist()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def series_body(data, scope, loc, start, end, metric):
+    index = scope_index(data, scope)
+    matrix = index.matrix
+    rows = index.locations(loc)
+    days = index.day_range(start, end)
+    values = series_values(matrix, metric)[rows, days]
+    return json.dumps({
+        'scope': scope,
+        'metric': metric,
+        'dates': index.dates[days],
+        'locations': matrix.names[rows].tolist(),
+        'values': to_json_lists(values),
+    }, separators=(',', ':')).encode()
+
+
+@functools.lru_cache(maxsize=4)
+def scopes_body(data):
+    scopes = {}
+    for scope in sorted(data.scopes):
+        index = scope_index(data, scope)
+        matrix = index.matrix
+        scopes[scope] = {
+            'from': index.dates[0] if index.dates else None,
+            'to': index.dates[-1] if index.dates else None,
+            'locations': matrix.names.tolist(),
+            'codes': matrix.codes.tolist(),
+        }
+    return json.dumps({'version': data.version, 'metrics': SERIES, 'scopes': scopes},
+                      separators=(',', ':')).encode()
+
+
+def make_etag(version, query):
+    digest = hashlib.sha1(repr(query).encode()).hexdigest()[:16]
+    return '%s-%s' % (version, digest)
+
+
+def matches(etag):
+    # A compressed response's ETag gets the algorithm appended, e.g.
+    # "<etag>:br" (see Flask-Compress), and the client sends that back
+    return any(tag.split(':')[0] == etag for tag in flask.request.if_none_match)
+
+
+def respond(etag, body):
+    if matches(etag):
+        response = flask.Response(status=304)
+    else:
+        response = flask.Response(body(), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def error(message, status=400):
+    return flask.Response(json.dumps({'error': message}), status=status,
+                          mimetype='application/json')
+
+
+def register(server, store):
+    """Add the /api routes to `server`, serving `store.current`."""
+    seen = {}
+
+    def current():
+        # Memoized responses hold on to their Dataset, so drop them once
+        # a newer one is served
+        data = store.current
+        if seen.get('version') != data.version:
+            series_body.cache_clear()
+            scopes_body.cache_clear()
+            scope_index.cache_clear()
+            seen['version'] = data.version
+        return data
+
+    @server.route('/api/scopes')
+    def api_scopes():
+        data = current()
+        return respond(make_etag(data.version, 'scopes'), lambda: scopes_body(data))
+
+    @server.route('/api/series')
+    def api_series():
+        data = current()
+        args = flask.request.args
+        query = (args.get('scope', 'us'), args.get('loc', ''), args.get('from', ''),
+                 args.get('to', ''), args.get('metric', 'cumulative'))
+        try:
+            return respond(make_etag(data.version, query), lambda: series_body(data, *query))
+        except QueryError as e:
+            return error(str(e))
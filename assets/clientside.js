@@ -0,0 +1,61 @@
+/* Clientside callbacks.
+ *
+ * viewport.width reports the window width, which sets how many points the
+ * per-location line graphs are downsampled to.
+ *
+ * maps.render draws the map and pie when COVID_CLIENTSIDE_MAPS=1.
+ * `payload` is built once per dataset version by day_matrix_payload() in
+ * Dashboard.py: map codes and location names, day-major counts, daily
+ * totals and the map/pie figures with their data arrays left empty. Moving
+ * a slider only reads one row of counts, so it never reaches the server.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    viewport: {
+        width: function(tab) {
+            return window.innerWidth;
+        }
+    },
+
+    maps: {
+        render: function(day, payload) {
+            if (!payload) {
+                return [window.dash_clientside.no_update,
+                        window.dash_clientside.no_update];
+            }
+            day = Math.min(day, payload.counts.length - 1);
+            var cases = payload.counts[day];
+            var limit = payload.threshold * payload.totals[day];
+
+            var z = new Array(cases.length);
+            var labels = [];
+            var values = [];
+            var other = 0;
+            var merged = false;
+            for (var i = 0; i < cases.length; i++) {
+                z[i] = cases[i] > 0 ? Math.log10(cases[i]) : 0;
+                // Same bucketing as pie_slices(): small locations become "Other"
+                if (cases[i] < limit) {
+                    other += cases[i];
+                    merged = true;
+                } else {
+                    labels.push(payload.names[i]);
+                    values.push(cases[i]);
+                }
+            }
+            if (merged) {
+                labels.push('Other');
+                values.push(other);
+            }
+
+            var map = Object.assign({}, payload.map, {
+                data: [Object.assign({}, payload.map.data[0],
+                                     {locations: payload.codes, text: payload.names, z: z})]
+            });
+            var pie = Object.assign({}, payload.pie, {
+                data: [Object.assign({}, payload.pie.data[0],
+                                     {labels: labels, values: values})]
+            });
+            return [map, pie];
+        }
+    }
+});
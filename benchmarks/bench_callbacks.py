@@ -0,0 +1,230 @@
+"""Benchmark every Dash callback against synthetic JHU-shaped data.
+
+    python benchmarks/bench_callbacks.py --scale 1x1 --scale 10x1 --scale 1x2 \
+        --out results.json [--compare baseline.json]
+
+Each --scale is LOCATIONSxDAYS relative to the real files (see
+synthetic.py). For every scale the data is generated, loaded through the
+same reader as the dashboard and swapped into Dashboard.store; each
+callback is then called directly, with no browser and no network. Reported
+per callback: latency percentiles over --repeat calls, peak memory of one
+extra call under tracemalloc, and the size of the JSON Dash would send,
+before and after the Brotli compression the server applies.
+
+With --compare, p50 latencies are checked against an earlier results file
+and the exit status is 1 if any grew by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import brotli
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+import synthetic
+
+
+# The Brotli level of the dashboard's responses (COMPRESS_BR_LEVEL)
+BR_LEVEL = 4
+
+# synthetic.write() file name -> the scope read from it
+SCOPES = {
+    'us': 'us_county',
+    'us_deaths': 'us_county_deaths',
+    'global': 'global',
+    'global_deaths': 'global_deaths',
+    'global_recovered': 'global_recovered',
+}
+
+
+def parse_scale(text):
+    locations, days = text.lower().split('x')
+    return float(locations), float(days)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_dataset(paths):
+    import dataset
+    import ingest
+    paths = {SCOPES[name]: path for name, path in paths.items()}
+    scopes = {}
+    for members in ingest.REGIONS.values():
+        scopes.update(ingest.build_region(
+            ingest.read_all({scope: paths[scope] for scope in members})))
+    return dataset.Dataset(scopes)
+
+
+def cases(Dashboard, data):
+    """(name, call) pairs for every callback, with a representative input."""
+    us_day = data['us'].num_days - 1
+    global_day = data['global'].num_days - 1
+    us_top = Dashboard.top_locations(data, 'us', Dashboard.DEFAULT_TOP, 'confirmed')
+    global_top = Dashboard.top_locations(data, 'global', Dashboard.DEFAULT_TOP, 'confirmed')
+
+    def uncached(render_map, arg):
+        def call():
+            Dashboard.map_cache.clear()
+            return render_map(arg)
+        return call
+
+    def cold_layout():
+        Dashboard.cached_layout.cache_clear()
+        Dashboard.initial_figures.cache_clear()
+        Dashboard.map_cache.clear()
+        return Dashboard.serve_layout()
+
+    return [
+        ('serve_layout', cold_layout),
+        ('serve_layout[cached]', Dashboard.serve_layout),
+        ('us_line_graphs[totals]', lambda: Dashboard.us_line_graphs(0)),
+        ('us_line_graphs[locations]', lambda: Dashboard.us_line_graphs(1)),
+        ('global_line_graphs[totals]', lambda: Dashboard.global_line_graphs(0)),
+        ('global_line_graphs[locations]', lambda: Dashboard.global_line_graphs(1)),
+        ('us_top_locations', lambda: Dashboard.us_top_locations(Dashboard.DEFAULT_TOP)),
+        ('us_line_graphs[top]', lambda: Dashboard.us_line_graphs(1, 'daily', 'confirmed', us_top)),
+        ('global_line_graphs[top]',
+         lambda: Dashboard.global_line_graphs(1, 'daily', 'confirmed', global_top)),
+        ('us_line_graphs[deaths]', lambda: Dashboard.us_line_graphs(1, 'daily', 'deaths')),
+        ('global_line_graphs[recovered]',
+         lambda: Dashboard.global_line_graphs(1, 'daily', 'recovered')),
+        ('us_map', uncached(Dashboard.us_map, us_day)),
+        ('us_map[cached]', lambda: Dashboard.us_map(us_day)),
+        ('global_map', uncached(Dashboard.global_map, global_day)),
+        ('global_map[cached]', lambda: Dashboard.global_map(global_day)),
+        ('us_animation', uncached(Dashboard.us_animation, ['play'])),
+        ('global_animation', uncached(Dashboard.global_animation, ['play'])),
+        ('us_map[deaths]', uncached(lambda day: Dashboard.us_map(day, 'deaths'), us_day)),
+    ]
+
+
+def measure(call, repeat):
+    output = call()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = np.array(times) * 1000
+    body = json.dumps(output, cls=PlotlyJSONEncoder).encode()
+    return {
+        'p50_ms': float(np.percentile(times, 50)),
+        'p90_ms': float(np.percentile(times, 90)),
+        'p99_ms': float(np.percentile(times, 99)),
+        'max_ms': float(times.max()),
+        'peak_kib': peak / 1024,
+        'bytes': len(body),
+        'wire_bytes': len(brotli.compress(body, quality=BR_LEVEL)),
+    }
+
+
+def run(scales, repeat, workdir):
+    # Dashboard reads its configuration at import, so point it at the
+    # smallest synthetic dataset first and swap the others in afterwards
+    first = synthetic.write(os.path.join(workdir, 'import'), *scales[0])
+    os.environ.update({'COVID_%s_URL' % name.upper(): path for name, path in first.items()})
+    os.environ.update({
+        'COVID_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'COVID_REFRESH': 'always',
+        'COVID_REFRESH_INTERVAL': '0',
+        'COVID_PREWARM_DAYS': '0',
+    })
+    import Dashboard
+
+    results = []
+    for location_scale, day_scale in scales:
+        label = '%gx%g' % (location_scale, day_scale)
+        paths = synthetic.write(os.path.join(workdir, label), location_scale, day_scale)
+        start = time.perf_counter()
+        data = load_dataset(paths)
+        load_ms = (time.perf_counter() - start) * 1000
+        Dashboard.store.swap(data)
+        Dashboard.map_cache.clear()
+        shape = {scope: list(data[scope].counts.shape) for scope in data.scopes}
+        print('%s: us %s, global %s, loaded in %.0f ms' % (
+            label, shape['us'], shape['global'], load_ms))
+        results.append({'scale': label, 'callback': 'load', 'shape': shape,
+                        'p50_ms': load_ms})
+
+        for name, call in cases(Dashboard, data):
+            result = measure(call, repeat)
+            print('  %-32s p50 %8.2f ms  p99 %8.2f ms  peak %8.0f KiB  %9d bytes  %8d on the wire' % (
+                name, result['p50_ms'], result['p99_ms'], result['peak_kib'], result['bytes'],
+                result['wire_bytes']))
+            results.append(dict(result, scale=label, callback=name, shape=shape))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print p50 ratios against `baseline`; returns the regressed entries."""
+    before = {(r['scale'], r['callback']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = before.get((result['scale'], result['callback']))
+        if old is None or not old['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / old['p50_ms']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(result)
+            flag = '  REGRESSION'
+        print('%-6s %-32s %8.2f -> %8.2f ms  x%.2f%s' % (
+            result['scale'], result['callback'], old['p50_ms'], result['p50_ms'], ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', action='append', type=parse_scale,
+                        help='LOCATIONSxDAYS, may be repeated (default 1x1)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p50 slowdown before --compare fails')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.scale or [(1, 1)], args.repeat, workdir)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print('Results written to %s' % args.out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Load test for the /api routes of a running dashboard server.
+
+    gunicorn -c gunicorn.conf.py wsgi:server      # or python Dashboard.py
+    python benchmarks/load_api.py --url http://127.0.0.1:8050 \
+        --concurrency 8 --duration 10 [--conditional]
+
+A fixed, seeded mix of /api/series queries (random scope, one to five
+locations, date range and metric) is built from /api/scopes and sent by
+--concurrency threads over keep-alive connections for --duration seconds.
+With --conditional every query after the first carries the ETag of its
+last response, as a polling client would, so unchanged data comes back as
+a 304. Reported: requests per second, latency percentiles, status codes
+and bytes received.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+import numpy as np
+
+METRICS = ('cumulative', 'new', 'new_avg', 'growth', 'growth_avg', 'doubling')
+
+
+def connect(url):
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme == 'https':
+        return http.client.HTTPSConnection(parts.netloc, timeout=30)
+    return http.client.HTTPConnection(parts.netloc, timeout=30)
+
+
+def get(conn, path, headers=None):
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    return response.status, response.getheader('ETag'), body
+
+
+def make_queries(scopes, count, seed=0):
+    rng = np.random.default_rng(seed)
+    names = sorted(scopes)
+    queries = []
+    for _ in range(count):
+        scope = names[rng.integers(len(names))]
+        info = scopes[scope]
+        picks = rng.choice(len(info['locations']), size=min(int(rng.integers(1, 6)),
+                                                           len(info['locations'])),
+                           replace=False)
+        # Codes where there are any, as most callers would use them
+        locs = [info['codes'][i] or info['locations'][i] for i in picks]
+        dates = np.arange(np.datetime64(info['from']), np.datetime64(info['to']) + 1)
+        start, end = sorted(rng.choice(dates, size=2))
+        queries.append('/api/series?' + urllib.parse.urlencode({
+            'scope': scope, 'loc': ','.join(locs), 'from': str(start), 'to': str(end),
+            'metric': METRICS[rng.integers(len(METRICS))]}))
+    return queries
+
+
+def worker(url, queries, deadline, conditional, offset, results):
+    conn = connect(url)
+    etags = {}
+    latencies = []
+    statuses = Counter()
+    received = 0
+    i = offset
+    while time.perf_counter() < deadline:
+        path = queries[i % len(queries)]
+        i += 1
+        # Compressed, as a browser would take it, so bytes are those on the wire
+        headers = {'Accept-Encoding': 'br, gzip'}
+        if conditional and path in etags:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        try:
+            status, etag, body = get(conn, path, headers)
+        except (OSError, http.client.HTTPException):
+            statuses['error'] += 1
+            conn.close()
+            conn = connect(url)
+            continue
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+        received += len(body)
+        if etag:
+            etags[path] = etag
+    conn.close()
+    results.append((latencies, statuses, received))
+
+
+def run(url, concurrency, duration, conditional, num_queries):
+    conn = connect(url)
+    status, _, body = get(conn, '/api/scopes')
+    conn.close()
+    if status != 200:
+        raise SystemExit('GET /api/scopes returned %d' % status)
+    queries = make_queries(json.loads(body)['scopes'], num_queries)
+
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(
+        url, queries, deadline, conditional, n * len(queries) // concurrency, results))
+        for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.concatenate([np.array(r[0]) for r in results]) * 1000
+    statuses = sum((r[1] for r in results), Counter())
+    received = sum(r[2] for r in results)
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'p90_ms': float(np.percentile(latencies, 90)) if len(latencies) else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'bytes': received,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--queries', type=int, default=200,
+                        help='distinct queries in the mix')
+    parser.add_argument('--conditional', action='store_true',
+                        help='send If-None-Match with the last ETag of each query')
+    args = parser.parse_args(argv)
+
+    result = run(args.url, args.concurrency, args.duration, args.conditional, args.queries)
+    print('%d requests in %.1fs: %.0f req/s' % (result['requests'], args.duration, result['rps']))
+    print('latency p50 %.2f ms  p90 %.2f ms  p99 %.2f ms' % (
+        result['p50_ms'], result['p90_ms'], result['p99_ms']))
+    print('statuses %s, %.1f MB received' % (result['statuses'], result['bytes'] / 1e6))
+    return 0 if result['requests'] and 'error' not in result['statuses'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
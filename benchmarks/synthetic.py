@@ -0,0 +1,121 @@
+"""Synthetic datasets in the JHU wide-CSV layout.
+
+The files have exactly the columns of the confirmed, deaths and recovered
+time_series_covid19_*.csv files, with cumulative counts that never
+decrease. At scale 1x1 the shape matches the real files (about 3,300
+US county rows in 58 states and 280 global rows in 190 countries, 450 days);
+the location scale multiplies rows and grouping keys, the day scale
+multiplies date columns.
+"""
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from location_codes import COUNTRY_CODES, US_STATE_CODES
+
+BASE_US_ROWS = 3300
+BASE_US_STATES = 58
+BASE_GLOBAL_ROWS = 280
+BASE_COUNTRIES = 190
+BASE_DAYS = 450
+
+US_COLUMNS = ['UID', 'iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 'Province_State',
+              'Country_Region', 'Lat', 'Long_', 'Combined_Key']
+GLOBAL_COLUMNS = ['Province/State', 'Country/Region', 'Lat', 'Long']
+
+
+def date_headers(num_days, start=date(2020, 1, 22)):
+    days = (start + timedelta(days=i) for i in range(num_days))
+    return ['%d/%d/%s' % (day.month, day.day, day.strftime('%y')) for day in days]
+
+
+def cumulative_counts(rng, rows, num_days):
+    # Each row grows at its own rate, starting on its own day
+    rates = rng.gamma(0.5, 40, size=(rows, 1))
+    starts = rng.integers(0, max(1, num_days // 3), size=(rows, 1))
+    daily = rng.poisson(rates, size=(rows, num_days))
+    daily[np.arange(num_days) < starts] = 0
+    return daily.cumsum(axis=1)
+
+
+def names(real, count, prefix):
+    return list(real[:count]) + ['%s %d' % (prefix, i) for i in range(len(real), count)]
+
+
+def us_frame(rng, location_scale=1, day_scale=1):
+    rows = int(BASE_US_ROWS * location_scale)
+    states = names(sorted(US_STATE_CODES), int(BASE_US_STATES * location_scale), 'State')
+    num_days = int(BASE_DAYS * day_scale)
+    state = np.array(states, dtype=object)[rng.integers(0, len(states), rows)]
+    meta = pd.DataFrame({
+        'UID': 84000000 + np.arange(rows),
+        'iso2': 'US',
+        'iso3': 'USA',
+        'code3': 840,
+        'FIPS': 1000.0 + np.arange(rows),
+        'Admin2': ['County %d' % i for i in range(rows)],
+        'Province_State': state,
+        'Country_Region': 'US',
+        'Lat': rng.uniform(20, 60, rows),
+        'Long_': rng.uniform(-160, -60, rows),
+    })
+    meta['Combined_Key'] = meta['Admin2'] + ', ' + meta['Province_State'] + ', US'
+    counts = pd.DataFrame(cumulative_counts(rng, rows, num_days),
+                          columns=date_headers(num_days))
+    return pd.concat([meta[US_COLUMNS], counts], axis=1)
+
+
+def global_frame(rng, location_scale=1, day_scale=1):
+    rows = int(BASE_GLOBAL_ROWS * location_scale)
+    countries = names(sorted(COUNTRY_CODES), int(BASE_COUNTRIES * location_scale), 'Country')
+    num_days = int(BASE_DAYS * day_scale)
+    # Every country gets a row, the rest are provinces of random countries
+    country = np.concatenate([countries, np.array(countries, dtype=object)[
+        rng.integers(0, len(countries), rows - len(countries))]])
+    province = [''] * len(countries) + ['Province %d' % i for i in range(rows - len(countries))]
+    meta = pd.DataFrame({
+        'Province/State': province,
+        'Country/Region': country,
+        'Lat': rng.uniform(-50, 70, rows),
+        'Long': rng.uniform(-180, 180, rows),
+    })
+    counts = pd.DataFrame(cumulative_counts(rng, rows, num_days),
+                          columns=date_headers(num_days))
+    return pd.concat([meta[GLOBAL_COLUMNS], counts], axis=1)
+
+
+def outcome(rng, frame, share, columns):
+    """A cumulative series that is a fixed per-row share of `frame`'s counts,
+    e.g. deaths as a share of confirmed cases."""
+    dates = [col for col in frame.columns if col not in columns]
+    rates = rng.uniform(*share, size=(len(frame), 1))
+    counts = pd.DataFrame((frame[dates].to_numpy() * rates).astype(np.int64), columns=dates)
+    return pd.concat([frame[columns], counts], axis=1)
+
+
+def write(directory, location_scale=1, day_scale=1, seed=0):
+    """Write every source the dashboard reads to `directory`.
+
+    Returns their paths by name: us, us_deaths, global, global_deaths and
+    global_recovered, named like the COVID_<NAME>_URL variables.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    us = us_frame(rng, location_scale, day_scale)
+    world = global_frame(rng, location_scale, day_scale)
+    us_deaths = outcome(rng, us, (0.005, 0.03), US_COLUMNS)
+    us_deaths.insert(len(US_COLUMNS), 'Population', rng.integers(1000, 10 ** 6, len(us)))
+    frames = {
+        'us': us,
+        'us_deaths': us_deaths,
+        'global': world,
+        'global_deaths': outcome(rng, world, (0.005, 0.03), GLOBAL_COLUMNS),
+        'global_recovered': outcome(rng, world, (0.8, 0.98), GLOBAL_COLUMNS),
+    }
+    paths = {}
+    for name, frame in frames.items():
+        paths[name] = os.path.join(directory, name + '.csv')
+        frame.to_csv(paths[name], index=False)
+    return paths
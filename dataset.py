@@ -0,0 +1,311 @@
+"""Location x day case matrices built once per data load.
+
+The callbacks in Dashboard.py never filter DataFrames per request; they
+slice rows (one location) or columns (one day) out of a LocationMatrix.
+"""
+import copy
+import hashlib
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import derived
+
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+METRICS = ('confirmed', 'deaths', 'recovered')
+
+
+def is_date_column(name):
+    try:
+        datetime.strptime(name, '%m/%d/%y')
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def date_columns(columns):
+    return [col for col in columns if is_date_column(col)]
+
+
+def scope_name(region, metric='confirmed'):
+    """The scope holding `metric` for `region`, e.g. 'global_deaths'.
+
+    Confirmed cases keep the plain region name.
+    """
+    return region if metric == 'confirmed' else '%s_%s' % (region, metric)
+
+
+def split_scope(scope):
+    """(region, metric) of a scope named by scope_name()."""
+    region, _, metric = scope.rpartition('_')
+    if region and metric in METRICS:
+        return region, metric
+    return scope, 'confirmed'
+
+
+def common_dates(date_lists):
+    """The dates every list starts with, i.e. the days all files have."""
+    date_lists = list(date_lists)
+    common = []
+    for dates in zip(*date_lists):
+        if any(date != dates[0] for date in dates):
+            break
+        common.append(dates[0])
+    return common
+
+
+def smallest_int(low, high):
+    """The smallest signed integer type holding `low`..`high`.
+
+    The type also holds the difference of any two such values, so new
+    cases (day-over-day differences) never overflow it.
+    """
+    span = int(high) - min(int(low), 0)
+    for dtype in INT_TYPES:
+        if span <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def downcast(counts):
+    """`counts` as the smallest integer type that holds them safely."""
+    counts = np.asarray(counts)
+    if counts.dtype.kind == 'f':
+        counts = np.nan_to_num(counts)
+    return counts.astype(smallest_int(counts.min(initial=0), counts.max(initial=0)),
+                         copy=False)
+
+
+class LocationMatrix:
+    """Cumulative counts for one scope, one row per location.
+
+    `counts` is a contiguous (locations, days) array of the smallest integer
+    type that holds it (see downcast()), `index` maps a location name to its
+    row and `codes` is aligned with the rows, holding the map code of each
+    location or None when it cannot be drawn. For a scope that is rolled up
+    into another, `parent` holds the parent row of every row. The derived
+    series (new cases, averages, growth) are computed here once, for the
+    locations in `derived` and for the scope totals in `derived_totals`.
+    """
+
+    def __init__(self, names, dates, counts, codes=None, arrays=None, parent=None):
+        self.names = np.asarray(names, dtype=object)
+        self.dates = list(dates)
+        counts = np.asarray(counts)
+        if counts.dtype.kind != 'i':
+            counts = downcast(counts)
+        self.counts = np.ascontiguousarray(counts)
+        self.index = {name: row for row, name in enumerate(self.names)}
+        if codes is None:
+            codes = self.names
+        self.codes = np.asarray(codes, dtype=object)
+        self.mapped = np.not_equal(self.codes, None)
+        if arrays is not None:
+            parent = arrays.get('parent', parent)
+        self.parent = None if parent is None else np.asarray(parent)
+        if arrays is None:
+            self.totals = self.counts.sum(axis=0, dtype=np.int64)
+            self.derived = derived.DerivedSeries(self.counts)
+            self.derived_totals = derived.DerivedSeries(self.totals[None, :])
+        else:
+            # Precomputed, e.g. memory-mapped from a snapshot
+            self.totals = arrays['totals']
+            self.derived = derived.DerivedSeries.from_arrays(
+                {name: arrays['derived.' + name] for name in derived.SERIES})
+            self.derived_totals = derived.DerivedSeries.from_arrays(
+                {name: arrays['derived_totals.' + name] for name in derived.SERIES})
+
+    def arrays(self):
+        """Every numeric array of this matrix by name, as taken by __init__."""
+        arrays = {'counts': self.counts, 'totals': self.totals}
+        if self.parent is not None:
+            arrays['parent'] = self.parent
+        for name, array in self.derived.arrays().items():
+            arrays['derived.' + name] = array
+        for name, array in self.derived_totals.arrays().items():
+            arrays['derived_totals.' + name] = array
+        return arrays
+
+    @property
+    def num_days(self):
+        return self.counts.shape[1]
+
+    def row(self, name):
+        return self.counts[self.index[name]]
+
+    def rows(self, names):
+        """Row numbers of `names`, leaving out names this scope does not have."""
+        return np.array([self.index[name] for name in names if name in self.index],
+                        dtype=np.intp)
+
+    def top(self, n, day=-1):
+        """Rows of the `n` locations with the highest counts on `day`, highest first."""
+        col = self.day(day)
+        if n <= 0:
+            return np.array([], dtype=np.intp)
+        if n < len(col):
+            rows = np.argpartition(col, len(col) - n)[len(col) - n:]
+        else:
+            rows = np.arange(len(col))
+        return rows[np.argsort(-col[rows].astype(np.int64), kind='stable')]
+
+    def day(self, day):
+        return self.counts[:, day]
+
+    def log_day(self, day):
+        """log10 of every location's count on `day`, with 0 for empty rows."""
+        col = self.day(day)
+        out = np.zeros(col.shape, dtype=float)
+        np.log10(col, out=out, where=col > 0)
+        return out
+
+    def extend(self, dates, counts):
+        """A new matrix with `counts` for the days `dates` appended.
+
+        `counts` must be row-aligned with this matrix. Totals and derived
+        series are only computed for the new days; this matrix is unchanged.
+        """
+        counts = np.asarray(counts)
+        matrix = copy.copy(self)
+        matrix.dates = self.dates + list(dates)
+        dtype = smallest_int(min(self.counts.min(initial=0), counts.min(initial=0)),
+                             max(self.counts.max(initial=0), counts.max(initial=0)))
+        matrix.counts = np.concatenate([self.counts, counts], axis=1).astype(dtype, copy=False)
+        matrix.totals = np.concatenate(
+            [self.totals, counts.sum(axis=0, dtype=np.int64)])
+        matrix.derived = self.derived.extend(matrix.counts, len(dates))
+        matrix.derived_totals = self.derived_totals.extend(
+            matrix.totals[None, :], len(dates))
+        return matrix
+
+
+def lookup_codes(names, code_table):
+    """The code of every name in `code_table`, aligned with `names`; None
+    for names the table maps to None or does not have."""
+    if code_table is None:
+        return None
+    codes, _ = resolve_codes(names, code_table)
+    return codes
+
+
+def resolve_codes(names, code_table):
+    """(codes, found): lookup_codes() and whether each name is in the table.
+
+    The names are looked up all at once in the sorted table keys.
+    """
+    names = np.asarray(names, dtype=object)
+    keys = np.array(sorted(code_table), dtype=object)
+    if not len(keys) or not len(names):
+        return np.full(len(names), None, dtype=object), np.zeros(len(names), dtype=bool)
+    values = np.array([code_table[key] for key in keys] + [None], dtype=object)
+    pos = np.minimum(np.searchsorted(keys, names), len(keys) - 1)
+    found = keys[pos] == names
+    return values[np.where(found, pos, len(keys))], found
+
+
+def unresolved_names(names, code_table):
+    """The names `code_table` has no entry for, i.e. not known to be unmapped."""
+    if code_table is None:
+        return []
+    _, found = resolve_codes(names, code_table)
+    return list(np.asarray(names, dtype=object)[~found])
+
+
+def group_rows(groups, num_groups):
+    """Order rows by group: group g is rows order[starts[g]:starts[g + 1]].
+
+    `groups[i]` is the group of row i, or -1 for rows that belong to none
+    (these are left out). Every group must have at least one row.
+    """
+    groups = np.asarray(groups)
+    order = np.argsort(groups, kind='stable')
+    order = order[np.searchsorted(groups[order], 0):]
+    starts = np.searchsorted(groups[order], np.arange(num_groups))
+    return order, starts
+
+
+def sum_rows(counts, order, starts):
+    """Sum the rows of `counts` per group, as ordered by group_rows()."""
+    if len(starts) == len(order):
+        # One row per group, nothing to add up
+        if (order == np.arange(len(order))).all():
+            return counts
+        return counts[order]
+    if not len(starts):
+        return counts[:0]
+    return downcast(np.add.reduceat(counts[order], starts, axis=0, dtype=np.int64))
+
+
+def align_rows(names, counts, all_names):
+    """`counts` with one row per entry of the sorted `all_names`.
+
+    `names` must be a subset of `all_names`; rows for the other names are
+    zero.
+    """
+    if len(names) == len(all_names) and (np.asarray(names) == all_names).all():
+        return counts
+    aligned = np.zeros((len(all_names), counts.shape[1]), dtype=counts.dtype)
+    aligned[np.searchsorted(all_names, names)] = counts
+    return aligned
+
+
+def rollup(matrix, names, code_table=None):
+    """Sum the rows of `matrix` into their parents, one row per entry of `names`.
+
+    `matrix.parent` is the rollup index: the position in `names` of every
+    row's parent, e.g. the state of each county.
+    """
+    order, starts = group_rows(matrix.parent, len(names))
+    counts = sum_rows(matrix.counts, order, starts)
+    return LocationMatrix(names, matrix.dates, counts, lookup_codes(names, code_table))
+
+
+class Dataset:
+    """Every scope of one data load, e.g. dataset['us'].
+
+    Datasets are never modified once built. `version` is a hash of every
+    location, date and count, so two processes holding the same data agree
+    on it and any revision gets a new one. A Dataset attached from a
+    snapshot is given the version it was published under instead of
+    hashing the arrays again.
+    """
+
+    def __init__(self, scopes, version=None):
+        self.scopes = dict(scopes)
+        if version is None:
+            digest = hashlib.sha1()
+            for scope, matrix in sorted(self.scopes.items()):
+                digest.update(scope.encode())
+                digest.update('\n'.join(map(str, matrix.names)).encode())
+                digest.update('\n'.join(matrix.dates).encode())
+                digest.update(matrix.counts.dtype.str.encode())
+                digest.update(np.ascontiguousarray(matrix.counts))
+            version = digest.hexdigest()[:12]
+        self.version = version
+
+    def __getitem__(self, scope):
+        return self.scopes[scope]
+
+    def metrics(self, region):
+        """The metrics loaded for `region`, in the order of METRICS."""
+        return [metric for metric in METRICS
+                if scope_name(region, metric) in self.scopes]
+
+
+class DatasetStore:
+    """Holds the current Dataset.
+
+    Readers take `store.current` once and use that object for the whole
+    request; a refresh builds a new Dataset and swaps the reference, so a
+    request never sees a half-updated dataset.
+    """
+
+    def __init__(self, dataset):
+        self.current = dataset
+        self._lock = threading.Lock()
+
+    def swap(self, dataset):
+        with self._lock:
+            previous, self.current = self.current, dataset
+        return previous
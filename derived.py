@@ -0,0 +1,90 @@
+"""Series derived from cumulative counts, computed for every location at once.
+
+Every function takes a (locations, days) array of cumulative counts and
+returns an array of the same shape, so a whole scope is handled with a
+handful of NumPy operations instead of a Python loop per location.
+"""
+import copy
+
+import numpy as np
+
+ROLLING_WINDOW = 7
+FLOAT = np.float32
+SERIES = ('new', 'new_avg', 'growth', 'growth_avg', 'doubling')
+
+
+def new_cases(counts):
+    # The first day has no previous day, so its new cases are its total
+    return np.diff(counts, axis=1, prepend=counts.dtype.type(0))
+
+
+def rolling_mean(values, window=ROLLING_WINDOW):
+    """Trailing `window`-day mean; the first days average what exists."""
+    sums = np.cumsum(values, axis=1, dtype=float)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    days = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return sums / days
+
+
+def growth_rate(counts):
+    """Day-over-day growth of the cumulative count, NaN before any cases."""
+    rate = np.full(counts.shape, np.nan)
+    previous = counts[:, :-1]
+    np.divide(np.diff(counts, axis=1), previous, out=rate[:, 1:],
+              where=previous > 0)
+    return rate
+
+
+def doubling_time(rate):
+    """Days for the count to double at `rate`, NaN when it is not growing."""
+    days = np.full(rate.shape, np.nan)
+    growing = np.nan_to_num(rate) > 0
+    np.divide(np.log(2), np.log1p(rate, where=growing, out=np.zeros(rate.shape)),
+              out=days, where=growing)
+    return days
+
+
+class DerivedSeries:
+    """All derived series of one scope, stored row-aligned with its counts.
+
+    Row i of every array belongs to location i; `totals` holds the same
+    series for the scope-wide totals as a single row.
+    """
+
+    def __init__(self, counts):
+        # Computed in double precision, stored in single: plenty for display
+        # and half the memory, which matters at county level
+        self.new = new_cases(counts)
+        growth = growth_rate(counts)
+        growth_avg = rolling_mean(np.nan_to_num(growth))
+        self.new_avg = rolling_mean(self.new).astype(FLOAT)
+        self.growth = growth.astype(FLOAT)
+        self.growth_avg = growth_avg.astype(FLOAT)
+        self.doubling = doubling_time(growth_avg).astype(FLOAT)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from the arrays of an earlier instance, without copying."""
+        series = cls.__new__(cls)
+        for name in SERIES:
+            setattr(series, name, arrays[name])
+        return series
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in SERIES}
+
+    def extend(self, counts, num_new):
+        """Return a copy covering `counts`, which has `num_new` more days.
+
+        Only the new days are computed, from a tail of `counts` long enough
+        for the rolling windows that reach back into the old days.
+        """
+        if num_new <= 0:
+            return copy.copy(self)
+        start = max(0, counts.shape[1] - num_new - ROLLING_WINDOW)
+        tail = DerivedSeries(counts[:, start:])
+        extended = copy.copy(self)
+        for name in SERIES:
+            setattr(extended, name, np.concatenate(
+                [getattr(self, name), getattr(tail, name)[:, -num_new:]], axis=1))
+        return extended
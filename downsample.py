@@ -0,0 +1,89 @@
+"""Shape-preserving downsampling of many line series at once.
+
+Implements largest-triangle-three-buckets (LTTB): the series is split into
+equal buckets and from each bucket the point forming the largest triangle
+with the previously kept point and the average of the next bucket is
+kept. Peaks and turns survive, so the curve looks the same at screen
+resolution with a fraction of the points.
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points LTTB keeps, for every row of `x` and `y`.
+
+    `x` and `y` are (rows, n) arrays; the result is (rows, n_out), or every
+    index when the rows already have no more than `n_out` points. Buckets
+    are walked once, each step handling all rows together.
+    """
+    rows, n = y.shape
+    if n_out >= n or n_out < 3:
+        return np.broadcast_to(np.arange(n), (rows, n))
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket i covers [edges[i], edges[i + 1]); the first and last points
+    # are always kept
+    edges = (np.arange(n_out - 1) * (n - 2) // (n_out - 2)) + 1
+    out = np.empty((rows, n_out), dtype=np.intp)
+    out[:, 0] = 0
+    out[:, -1] = n - 1
+    row = np.arange(rows)
+    kept = np.zeros(rows, dtype=np.intp)
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = end, edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[:, next_start:next_end].mean(axis=1)
+        avg_y = y[:, next_start:next_end].mean(axis=1)
+        kept_x = x[row, kept][:, None]
+        kept_y = y[row, kept][:, None]
+        area = np.abs((kept_x - avg_x[:, None]) * (y[:, start:end] - kept_y)
+                      - (kept_x - x[:, start:end]) * (avg_y[:, None] - kept_y))
+        kept = start + area.argmax(axis=1)
+        out[:, i + 1] = kept
+    return out
+
+
+def in_range(x, x_range):
+    """Mask of the points inside `x_range`, plus one neighbour on each side
+    so that lines still run to the edges of a zoomed view."""
+    inside = (x >= x_range[0]) & (x <= x_range[1])
+    keep = inside.copy()
+    keep[..., :-1] |= inside[..., 1:]
+    keep[..., 1:] |= inside[..., :-1]
+    return keep
+
+
+def downsample_rows(x, y, n_out, x_range=None):
+    """Downsample every row of `y` to about `n_out` points.
+
+    `x` is either shared by all rows (1-D) or given per row (2-D). With
+    `x_range` only the points inside it are considered, which is how a
+    zoomed view gets full resolution for the visible span. Returns a list
+    of (x, y) pairs, one per row.
+    """
+    if x.ndim == 1:
+        if x_range is not None:
+            cols = in_range(x, x_range)
+            x, y = x[cols], y[:, cols]
+        x = np.broadcast_to(x, y.shape)
+        idx = lttb_indices(x, y, n_out)
+        return list(zip(np.take_along_axis(x, idx, axis=1),
+                        np.take_along_axis(y, idx, axis=1)))
+
+    if x_range is None:
+        idx = lttb_indices(x, y, n_out)
+        return list(zip(np.take_along_axis(x, idx, axis=1),
+                        np.take_along_axis(y, idx, axis=1)))
+
+    # Per-row x (e.g. cumulative totals) gives each row its own window
+    rows = []
+    for row_x, row_y in zip(x, y):
+        keep = in_range(row_x, x_range)
+        row_x, row_y = row_x[keep], row_y[keep]
+        idx = lttb_indices(row_x[None, :], row_y[None, :], n_out)[0]
+        rows.append((row_x[idx], row_y[idx]))
+    return rows
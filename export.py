@@ -0,0 +1,255 @@
+"""Static export of every dashboard view, for serving from a CDN.
+
+    python Dashboard.py export [OUTDIR] [--workers N] [--full]
+
+For every metric of both tabs this writes the line graphs in both views
+(totals and per location) and the map and pie of every day as JSON
+figures under OUTDIR/figures, plus index.html and plotly.min.js, a page
+that browses them without any server code. Rendering is spread over a
+pool of forked processes.
+
+Exports are incremental: manifest.json keeps a fingerprint of every day's
+counts, and a later export only renders the days that are new or whose
+counts changed, or every day of a scope whose map codes changed. The
+line graphs span every day and are always rendered.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+
+import dataset
+
+MANIFEST = 'manifest.json'
+LINE_VIEWS = {'totals': 0, 'locations': 1}
+CHUNK_SIZE = 16
+
+# The Dashboard module being exported, inherited by the forked workers
+dashboard = None
+
+
+def figure_path(scope, view):
+    return os.path.join('figures', scope, view + '.json')
+
+
+def day_fingerprints(matrix):
+    """A short hash of every day's counts, mapped locations only."""
+    # Hashed as int64, as counts are stored in the narrowest type that
+    # holds them, which can widen from one load to the next
+    counts = matrix.counts[matrix.mapped].astype(np.int64)
+    return [hashlib.blake2b(counts[:, day].tobytes(), digest_size=8).hexdigest()
+            for day in range(matrix.num_days)]
+
+
+def codes_fingerprint(matrix):
+    """A short hash of the map codes, which every map of the scope shows."""
+    codes = '\n'.join(matrix.codes[matrix.mapped]).encode()
+    return hashlib.blake2b(codes, digest_size=8).hexdigest()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'scopes': {}}
+
+
+def scopes_of(data):
+    """(scope, region, metric) of every metric of both tabs."""
+    for region in ('us', 'global'):
+        for metric in data.metrics(region):
+            yield dataset.scope_name(region, metric), region, metric
+
+
+@functools.lru_cache(maxsize=None)
+def map_templates(version, scope):
+    # Once per scope and process: the days only fill in the data arrays
+    data = dashboard.store.current
+    return dashboard.map_templates(data[scope], dashboard.map_renderer(scope))
+
+
+def render_view(out_dir, view):
+    """Render one view, ('lines', scope, name) or ('map', scope, day), to
+    its file; returns the number of bytes written."""
+    kind, scope, arg = view
+    data = dashboard.store.current
+    region, metric = dataset.split_scope(scope)
+    if kind == 'lines':
+        line_graphs = dashboard.us_line_graphs if region == 'us' else dashboard.global_line_graphs
+        figures = line_graphs(LINE_VIEWS[arg], 'daily', metric, data=data)
+        path = figure_path(scope, 'lines-' + arg)
+    else:
+        figures = dashboard.fill_map_templates(map_templates(data.version, scope),
+                                               data[scope], arg)
+        path = figure_path(scope, 'map-%d' % arg)
+    body = json.dumps(figures, cls=PlotlyJSONEncoder, separators=(',', ':'))
+    with open(os.path.join(out_dir, path), 'w') as f:
+        f.write(body)
+    return len(body)
+
+
+def render_views(out_dir, views, workers):
+    if workers < 2 or len(views) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [render_view(out_dir, view) for view in views]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        return list(pool.map(render_view, [out_dir] * len(views), views,
+                             chunksize=CHUNK_SIZE))
+
+
+def output_size(out_dir):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(out_dir) for name in names)
+
+
+def export(module, out_dir, workers=None, full=False):
+    """Render every view of `module`'s current dataset into `out_dir`.
+
+    Returns a summary: figures rendered and skipped, seconds taken and the
+    total size of `out_dir`.
+    """
+    global dashboard
+    dashboard = module
+    start = time.perf_counter()
+    data = module.store.current
+    previous = {} if full else load_manifest(out_dir)['scopes']
+
+    views = []
+    skipped = 0
+    scopes = {}
+    for scope, region, metric in scopes_of(data):
+        matrix = data[scope]
+        os.makedirs(os.path.join(out_dir, 'figures', scope), exist_ok=True)
+        fingerprints = day_fingerprints(matrix)
+        codes = codes_fingerprint(matrix)
+        old = previous.get(scope, {})
+        old = old.get('days', []) if old.get('codes') == codes else []
+        views.extend(('lines', scope, name) for name in LINE_VIEWS)
+        for day, fingerprint in enumerate(fingerprints):
+            exists = os.path.exists(os.path.join(out_dir, figure_path(scope, 'map-%d' % day)))
+            if day < len(old) and old[day] == fingerprint and exists:
+                skipped += 1
+            else:
+                views.append(('map', scope, day))
+        scopes[scope] = {'region': region, 'metric': metric,
+                         'label': module.METRIC_LABELS[metric],
+                         'dates': matrix.dates, 'codes': codes, 'days': fingerprints}
+
+    sizes = render_views(out_dir, views, workers or os.cpu_count() or 1)
+
+    plotly_path = os.path.join(out_dir, 'plotly.min.js')
+    if not os.path.exists(plotly_path):
+        with open(plotly_path, 'w') as f:
+            f.write(get_plotlyjs())
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write(INDEX_HTML)
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump({'version': data.version, 'scopes': scopes}, f)
+
+    seconds = time.perf_counter() - start
+    return {
+        'rendered': len(views),
+        'skipped': skipped,
+        'figure_bytes': sum(sizes),
+        'seconds': seconds,
+        'figures_per_second': len(views) / seconds if seconds else 0.0,
+        'output_bytes': output_size(out_dir),
+    }
+
+
+def main(module, argv=None):
+    parser = argparse.ArgumentParser(prog='Dashboard.py export',
+                                     description=__doc__.split('\n')[0])
+    parser.add_argument('out_dir', nargs='?', default='static_export')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='rendering processes (default: one per CPU)')
+    parser.add_argument('--full', action='store_true',
+                        help='render every day, even those already exported')
+    args = parser.parse_args(argv)
+
+    summary = export(module, args.out_dir, args.workers, args.full)
+    print('Rendered %d figures (%d days unchanged) in %.1fs, %.1f figures/s' % (
+        summary['rendered'], summary['skipped'], summary['seconds'],
+        summary['figures_per_second']))
+    print('Wrote %.1f MB of figures; %s holds %.1f MB' % (
+        summary['figure_bytes'] / 1e6, args.out_dir, summary['output_bytes'] / 1e6))
+    return 0
+
+
+INDEX_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>COVID-19 Dashboard</title>
+<script src="plotly.min.js"></script>
+<style>
+  body { background: #111; color: #ddd; font-family: sans-serif; margin: 20px 50px; }
+  .controls > * { margin-right: 20px; }
+  .graph { height: 500px; }
+</style>
+</head>
+<body>
+<div class="controls">
+  <select id="scope"></select>
+  <button id="view">Switch Graph View</button>
+  <input id="day" type="range" min="0" value="0" step="1" style="width: 40%">
+  <span id="date"></span>
+</div>
+<div id="line" class="graph"></div>
+<div id="line_2" class="graph"></div>
+<div id="map" class="graph"></div>
+<div id="pie" class="graph"></div>
+<script>
+var manifest, views = ['totals', 'locations'], view = 0;
+var scope = document.getElementById('scope'), day = document.getElementById('day');
+
+function load(path, ids) {
+  fetch('figures/' + scope.value + '/' + path + '.json')
+    .then(function (response) { return response.json(); })
+    .then(function (figures) {
+      ids.forEach(function (id, i) { Plotly.react(id, figures[i]); });
+    });
+}
+
+function showLines() { load('lines-' + views[view], ['line', 'line_2']); }
+
+function showMap() {
+  document.getElementById('date').textContent = manifest.scopes[scope.value].dates[day.value];
+  load('map-' + day.value, ['map', 'pie']);
+}
+
+function showScope() {
+  var days = manifest.scopes[scope.value].dates.length;
+  day.max = days - 1;
+  day.value = days - 1;
+  showLines();
+  showMap();
+}
+
+fetch('manifest.json')
+  .then(function (response) { return response.json(); })
+  .then(function (data) {
+    manifest = data;
+    Object.keys(manifest.scopes).forEach(function (name) {
+      var info = manifest.scopes[name], option = document.createElement('option');
+      option.value = name;
+      option.textContent = (info.region === 'us' ? 'United States' : 'Global') + ': ' + info.label;
+      scope.appendChild(option);
+    });
+    scope.onchange = showScope;
+    day.oninput = showMap;
+    document.getElementById('view').onclick = function () { view = 1 - view; showLines(); };
+    showScope();
+  });
+</script>
+</body>
+</html>
+'''
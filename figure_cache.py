@@ -0,0 +1,115 @@
+"""Memoized figures for callbacks whose inputs come from a small domain.
+
+The map and pie for a given day only change when the dataset does, so they
+are rendered once, serialized to JSON and served from a bounded LRU cache
+keyed on (dataset version, tab, day). Entries for any other dataset
+version are dropped as soon as a request for the current version arrives;
+requests still holding an older dataset are rendered but neither stored
+nor allowed to drop anything.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from plotly.utils import PlotlyJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.environ.get('COVID_FIGURE_CACHE_SIZE', 512))
+PREWARM_DAYS = int(os.environ.get('COVID_PREWARM_DAYS', 0))
+PREWARM_WORKERS = int(os.environ.get('COVID_PREWARM_WORKERS', 4))
+
+
+class FigureCache:
+    """LRU cache of serialized figures with hit/miss counters.
+
+    `current_version` returns the version being served (e.g. that of
+    store.current); only that version replaces the cached one. Without it,
+    any version other than the cached one does.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, current_version=None):
+        self.maxsize = maxsize
+        self.current_version = current_version
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, version, key):
+        with self._lock:
+            if version != self.version:
+                if self.current_version is not None and version != self.current_version():
+                    # A request still holding an older dataset
+                    self.misses += 1
+                    return None
+                self._entries.clear()
+                self.version = version
+            serialized = self._entries.get(key)
+            if serialized is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return serialized
+
+    def _store(self, version, key, serialized):
+        with self._lock:
+            if version != self.version or self.maxsize <= 0:
+                return
+            self._entries[key] = serialized
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, version, key, render):
+        """Return the figures for `key`, calling `render()` on a miss.
+
+        `render` returns a figure or a tuple of figures; the result is
+        always plain JSON data (dicts and lists), ready for Dash.
+        """
+        serialized = self._lookup(version, key)
+        if serialized is None:
+            # Rendered outside the lock, so a slow miss never blocks hits
+            serialized = json.dumps(render(), cls=PlotlyJSONEncoder)
+            self._store(version, key, serialized)
+        figures = json.loads(serialized)
+        return tuple(figures) if isinstance(figures, list) else figures
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'version': self.version,
+            }
+
+
+def prewarm(cache, version, jobs, workers=PREWARM_WORKERS):
+    """Render `jobs`, an iterable of (key, render) pairs, into `cache`.
+
+    Runs on a background thread with a pool of `workers` so that startup is
+    not delayed; returns that thread.
+    """
+    jobs = list(jobs)
+
+    def run():
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(cache.get, version, key, render)
+                       for key, render in jobs]
+        failed = sum(future.exception() is not None for future in futures)
+        logger.info('Prewarmed %d figures, %d failed', len(jobs) - failed, failed)
+
+    thread = threading.Thread(target=run, name='figure-prewarm', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,71 @@
+"""Compact JSON for figures with many numeric traces.
+
+Plotly's JSON encoder writes NumPy arrays as lists of numbers, several
+characters per value. plotly.js 2.28 and later (bundled with the pinned
+dash 2.x and plotly 5.x) also accepts typed arrays,
+{'dtype': 'i4', 'bdata': <base64>}, which it decodes without parsing:
+`compact_figure()` sends every numeric trace array that way, in the
+narrowest type that holds its values, and replaces runs of consecutive
+integers (day numbers) with a start and a step. The per-trace-type defaults
+of the template are trimmed to the trace types actually drawn.
+"""
+import base64
+
+import numpy as np
+
+# NumPy type -> plotly.js typed array type, narrowest first
+INT_CODES = ((np.int8, 'i1'), (np.uint8, 'u1'), (np.int16, 'i2'), (np.uint16, 'u2'),
+             (np.int32, 'i4'), (np.uint32, 'u4'))
+FLOAT_CODES = {np.dtype(np.float32): 'f4', np.dtype(np.float64): 'f8'}
+AXES = ('x', 'y')
+
+
+def narrowest(values):
+    """`values` as the narrowest int type, or as float32 for floats."""
+    if values.dtype.kind == 'f':
+        return values.astype(np.float32, copy=False)
+    low, high = values.min(initial=0), values.max(initial=0)
+    for int_type, _ in INT_CODES:
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            return values.astype(int_type, copy=False)
+    return values.astype(np.float64)
+
+
+def typed_array(values):
+    """A plotly.js typed array spec for a 1-D numeric array."""
+    values = np.ascontiguousarray(narrowest(values))
+    code = FLOAT_CODES.get(values.dtype) or dict(INT_CODES)[values.dtype.type]
+    return {'dtype': code, 'bdata': base64.b64encode(values).decode('ascii')}
+
+
+def is_range(values):
+    return (values.dtype.kind in 'iu' and len(values) > 1
+            and bool((np.diff(values) == 1).all()))
+
+
+def compact_trace(trace):
+    for axis in AXES:
+        values = trace.get(axis)
+        if not isinstance(values, np.ndarray) or values.dtype.kind not in 'iuf':
+            continue
+        if is_range(values):
+            del trace[axis]
+            trace[axis + '0'] = int(values[0])
+            trace['d' + axis] = 1
+        else:
+            trace[axis] = typed_array(values)
+    return trace
+
+
+def compact_figure(fig):
+    """`fig` as a dict for dcc.Graph, with compact trace data."""
+    figure = fig.to_plotly_json()
+    for trace in figure['data']:
+        compact_trace(trace)
+    template = figure['layout'].get('template')
+    if template and 'data' in template:
+        types = {trace.get('type', 'scatter') for trace in figure['data']}
+        template['data'] = {kind: defaults for kind, defaults in template['data'].items()
+                            if kind in types}
+    return figure
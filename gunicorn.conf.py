@@ -0,0 +1,54 @@
+"""Gunicorn settings for serving the dashboard with several workers.
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+The master loads the data once and publishes it as a snapshot before any
+worker starts, then runs `refresh.py` as a loader process that publishes
+new versions. Workers only memory-map the current snapshot, so they start
+almost instantly and share one copy of the data however many there are.
+
+Every process writes its metrics to COVID_METRICS_DIR (a temporary
+directory by default), so /metrics reports all of them added up whichever
+worker answers (see metrics.py).
+"""
+import glob
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.environ.get('COVID_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('COVID_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('COVID_THREADS', 2))
+chdir = HERE
+
+# Inherited by the workers, which then attach instead of loading
+os.environ['COVID_ROLE'] = 'worker'
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), 'covid-metrics-%d' % os.getpid())
+os.environ.setdefault('COVID_METRICS_DIR', DEFAULT_METRICS_DIR)
+
+
+def on_starting(server):
+    # Values left by an earlier run would be added to this one's
+    os.makedirs(os.environ['COVID_METRICS_DIR'], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ['COVID_METRICS_DIR'], 'metrics-*.json')):
+        os.remove(path)
+    sys.path.insert(0, HERE)
+    import ingest
+    data = ingest.load()
+    server.log.info('Data snapshot %s published', data.version)
+    server.loader = subprocess.Popen([sys.executable, os.path.join(HERE, 'refresh.py')],
+                                     env=dict(os.environ, COVID_ROLE='loader'))
+
+
+def on_exit(server):
+    loader = getattr(server, 'loader', None)
+    if loader is not None:
+        loader.terminate()
+        loader.wait()
+    if os.environ['COVID_METRICS_DIR'] == DEFAULT_METRICS_DIR:
+        shutil.rmtree(DEFAULT_METRICS_DIR, ignore_errors=True)
@@ -0,0 +1,628 @@
+"""Fetching the JHU time series and caching them as a local snapshot.
+
+Snapshots are published as versions in the cache directory: `v-<version>/`
+holds one .npy file per array of every scope (counts, totals and derived
+series) and a meta.json with location names, dates and where the data came
+from, and the CURRENT file names the version in use. Startup memory-maps
+the current version, so a warm start does no network I/O, no CSV parsing
+and no arithmetic, and any number of processes attached to one version
+share a single copy of the data. The CSVs are only fetched when there is
+no snapshot yet, when it is older than the maximum age, or when a refresh
+is requested explicitly.
+
+Confirmed cases, deaths and (globally) recoveries are separate sources,
+downloaded concurrently and read on a process pool. The sources of one
+region are aligned to the same days and locations, so the dashboard can
+switch metric without loading anything. US rows are kept per county
+(scope 'us_county', keyed by FIPS code) and summed into states ('us')
+through the rollup index stored with the counties; the nation is the
+states' totals. CSVs are read in chunks into compact integer arrays.
+Tracing the peak memory of a read (reported in the log and as
+covid_ingest_peak_bytes) slows it down, so it is off unless
+COVID_TRACE_MEMORY is set; `python ingest.py` always traces.
+
+Configuration comes from the environment:
+
+    COVID_US_URL, COVID_GLOBAL_URL  confirmed cases CSV, a URL or a local path
+    COVID_US_DEATHS_URL,            deaths and recoveries CSVs, likewise
+      COVID_GLOBAL_DEATHS_URL,
+      COVID_GLOBAL_RECOVERED_URL
+    COVID_CACHE_DIR                 snapshot directory
+    COVID_REFRESH                   'auto' (default), 'always' or 'never'
+    COVID_MAX_AGE                   seconds before 'auto' refetches
+    COVID_FETCH_TIMEOUT             seconds before a download is abandoned
+    COVID_FETCH_ATTEMPTS            tries per download before giving up
+    COVID_PARSE_WORKERS             processes reading CSVs (default: one per CPU,
+                                    at most one per source); below 2, CSVs are
+                                    read on the download threads
+    COVID_TRACE_MEMORY              1 to record the peak memory of every read
+
+Run `python ingest.py` to refresh the snapshot by hand.
+"""
+import functools
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import dataset
+import metrics
+from location_codes import COUNTRY_CODES, US_STATE_CODES
+
+logger = logging.getLogger(__name__)
+
+JHU_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
+
+
+def source(variable, file_name):
+    return os.environ.get(variable, JHU_URL + file_name)
+
+
+# scope -> (source, column the rows are grouped by, map code table). US
+# rows are counties, keyed by FIPS code; scopes are named by
+# dataset.scope_name()
+SOURCES = {
+    'us_county': (source('COVID_US_URL', 'time_series_covid19_confirmed_US.csv'),
+                  'FIPS', None),
+    'us_county_deaths': (source('COVID_US_DEATHS_URL', 'time_series_covid19_deaths_US.csv'),
+                         'FIPS', None),
+    'global': (source('COVID_GLOBAL_URL', 'time_series_covid19_confirmed_global.csv'),
+               'Country/Region', COUNTRY_CODES),
+    'global_deaths': (source('COVID_GLOBAL_DEATHS_URL', 'time_series_covid19_deaths_global.csv'),
+                      'Country/Region', COUNTRY_CODES),
+    'global_recovered': (source('COVID_GLOBAL_RECOVERED_URL',
+                                'time_series_covid19_recovered_global.csv'),
+                         'Country/Region', COUNTRY_CODES),
+}
+
+# scope -> (scope it sums, column naming the parent of each row, map code table)
+ROLLUPS = {
+    'us': ('us_county', 'Province_State', US_STATE_CODES),
+    'us_deaths': ('us_county_deaths', 'Province_State', US_STATE_CODES),
+}
+
+# region -> its source scopes, which share one date axis and location index.
+# Confirmed cases come first and are the only ones a region needs
+REGIONS = {}
+for _scope in SOURCES:
+    REGIONS.setdefault(dataset.split_scope(_scope)[0], []).append(_scope)
+
+CACHE_DIR = os.environ.get('COVID_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data_cache'))
+REFRESH = os.environ.get('COVID_REFRESH', 'auto')
+MAX_AGE = float(os.environ.get('COVID_MAX_AGE', 6 * 60 * 60))
+FETCH_TIMEOUT = float(os.environ.get('COVID_FETCH_TIMEOUT', 60))
+FETCH_ATTEMPTS = int(os.environ.get('COVID_FETCH_ATTEMPTS', 3))
+PARSE_WORKERS = int(os.environ.get('COVID_PARSE_WORKERS', min(len(SOURCES), os.cpu_count() or 1)))
+TRACE_MEMORY = os.environ.get('COVID_TRACE_MEMORY', '') == '1'
+KEEP_VERSIONS = 3
+CHUNK_ROWS = 250
+
+
+def is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def download_path(url, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, 'downloads',
+                        os.path.basename(urllib.parse.urlparse(url).path))
+
+
+def fetch_source(url, validators=None, timeout=FETCH_TIMEOUT, cache_dir=CACHE_DIR):
+    """Make the CSV at `url` available as a local file unless it matches `validators`.
+
+    Returns (path, validators) where path is None when the source has not
+    changed. HTTP sources are asked with If-None-Match/If-Modified-Since
+    and streamed to a file under the cache directory, so a download is never
+    held in memory; local files are used in place and compared by
+    modification time and size.
+    """
+    validators = validators or {}
+    if not is_url(url):
+        stat = os.stat(url)
+        current = {'last_modified': '%d-%d' % (stat.st_mtime_ns, stat.st_size)}
+        if current == validators:
+            return None, validators
+        return url, current
+
+    request = urllib.request.Request(url)
+    if validators.get('etag'):
+        request.add_header('If-None-Match', validators['etag'])
+    if validators.get('last_modified'):
+        request.add_header('If-Modified-Since', validators['last_modified'])
+    path = download_path(url, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = '%s.tmp-%d-%d' % (path, os.getpid(), threading.get_ident())
+    deadline = time.monotonic() + timeout
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            with open(partial, 'wb') as f:
+                # `timeout` bounds the whole download, not just each read
+                for block in iter(lambda: response.read1(1 << 16), b''):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError('Download of %s took over %gs' % (url, timeout))
+                    f.write(block)
+            if response.length:
+                # The connection closed before Content-Length bytes came
+                raise ConnectionError('Download of %s ended %d bytes short'
+                                      % (url, response.length))
+            headers = response.headers
+        os.replace(partial, path)
+    except urllib.error.HTTPError as err:
+        if err.code == 304:
+            return None, validators
+        raise
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path, {'etag': headers.get('ETag'),
+                  'last_modified': headers.get('Last-Modified')}
+
+
+def fetch_with_retries(url, validators=None, attempts=FETCH_ATTEMPTS, cache_dir=CACHE_DIR):
+    """fetch_source(), retried with backoff when a download fails or times out.
+
+    Client errors (4xx) and local files are not retried.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return fetch_source(url, validators, cache_dir=cache_dir)
+        except OSError as err:
+            client_error = isinstance(err, urllib.error.HTTPError) and err.code < 500
+            if attempt == attempts or client_error or not is_url(url):
+                raise
+            logger.warning('Fetching %s failed (%s), attempt %d of %d',
+                           url, err, attempt, attempts)
+            time.sleep(min(2 ** attempt, 30))
+
+
+def local_path(url, cache_dir=CACHE_DIR):
+    """Where the last fetch of `url` left its CSV."""
+    return download_path(url, cache_dir) if is_url(url) else url
+
+
+def parse(path, **kwargs):
+    """Read a fetched CSV; `kwargs` go to pd.read_csv (usecols, nrows...)."""
+    return pd.read_csv(path, **kwargs)
+
+
+def row_keys(chunk, key):
+    """The grouping key of every row of `chunk`.
+
+    Counties are keyed by their 5-digit FIPS code; the few rows without one
+    (cruise ships, unassigned cases) fall back to their UID.
+    """
+    if key != 'FIPS':
+        return chunk[key]
+    fips = chunk['FIPS'].fillna(chunk['UID']).astype(np.int64)
+    return fips.map('{:05d}'.format)
+
+
+def count_rows(path):
+    """Data rows in the CSV at `path`, counted without parsing it."""
+    with open(path, 'rb') as f:
+        lines = sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            lines += 1
+    return max(lines - 1, 0)
+
+
+def read_counts(path, key, parent=None, dates=None, chunksize=CHUNK_ROWS):
+    """Stream the JHU CSV at `path` into one row of counts per `key`.
+
+    Only the key, `parent` and date columns are parsed, `chunksize` rows at
+    a time, straight into one counts array that ends up as the smallest safe
+    integer type; names are kept as categoricals. The whole file never
+    exists as a DataFrame, so reading takes little more memory than its
+    result. `dates`
+    limits the date columns read. Returns (names, dates, counts, parents)
+    with names sorted and `parents` a Categorical holding the `parent` of
+    each name (None when no `parent` is given).
+    """
+    if dates is None:
+        dates = dataset.date_columns(parse(path, nrows=0).columns)
+    key_columns = ['FIPS', 'UID'] if key == 'FIPS' else [key]
+    labels = [parent] if parent else []
+    dtype = {column: 'category' for column in labels + [key] if column != 'FIPS'}
+    counts = np.empty((count_rows(path), len(dates)), dtype=np.int32)
+    low = high = 0
+    keys, parents = [], []
+    rows = 0
+    for chunk in parse(path, usecols=key_columns + labels + dates, dtype=dtype,
+                       chunksize=chunksize):
+        keys.append(pd.Categorical(row_keys(chunk, key)))
+        if parent:
+            parents.append(chunk[parent].array)
+        # Column by column, so no second copy of the chunk is made
+        for column, date in enumerate(dates):
+            values = chunk[date].to_numpy()
+            if values.dtype.kind == 'f':
+                values = np.nan_to_num(values)
+            low, high = min(low, values.min(initial=0)), max(high, values.max(initial=0))
+            if dataset.smallest_int(low, high).itemsize > counts.itemsize:
+                counts = counts.astype(np.int64)
+            counts[rows:rows + len(values), column] = values
+        rows += len(chunk)
+        del chunk
+    counts = counts[:rows].astype(dataset.smallest_int(low, high), copy=False)
+
+    if not keys:
+        return np.array([], dtype=object), dates, counts, None
+    keys = union_categoricals(keys, sort_categories=True)
+    order, starts = dataset.group_rows(keys.codes, len(keys.categories))
+    counts = dataset.sum_rows(counts, order, starts)
+    names = keys.categories.to_numpy(dtype=object)
+    if not parent:
+        return names, dates, counts, None
+    parents = union_categoricals(parents, sort_categories=True)
+    parents = pd.Categorical.from_codes(parents.codes[order[starts]], parents.categories)
+    return names, dates, counts, parents
+
+
+def code_table(scope):
+    spec = SOURCES.get(scope) or ROLLUPS.get(scope)
+    return spec[2] if spec else None
+
+
+def rollup_of(scope):
+    """The scope rolled up from source `scope`, or None."""
+    return next((name for name, spec in ROLLUPS.items() if spec[0] == scope), None)
+
+
+def read_source(scope, path, trace_memory=False):
+    """read_counts() for source `scope`; returns (result, timer stats).
+
+    Runs in a parse worker process, so the stats are recorded by the caller.
+    """
+    rollup = rollup_of(scope)
+    with metrics.timer('read', scope, trace_memory=trace_memory) as stats:
+        result = read_counts(path, SOURCES[scope][1], ROLLUPS[rollup][1] if rollup else None)
+    names, dates, counts, parents = result
+    logger.info('Read %s: %d rows x %d days as %s (%.1f MB) from %.1f MB of CSV%s',
+                scope, counts.shape[0], counts.shape[1], counts.dtype, counts.nbytes / 1e6,
+                os.path.getsize(path) / 1e6,
+                ', peak %.1f MB' % (stats['peak_bytes'] / 1e6) if trace_memory else '')
+    return result, stats
+
+
+def parse_pool(workers=PARSE_WORKERS):
+    """A process pool for read_source(), or None to read in the calling thread."""
+    if workers < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    # A fork pool starts every worker on its first task: do that now, while
+    # no download thread exists yet
+    pool.submit(int).result()
+    return pool
+
+
+def read_all(paths, workers=0):
+    """read_source() every CSV of {scope: path}; returns the results by scope."""
+    pool = parse_pool(workers)
+    try:
+        if pool is None:
+            read = {scope: read_source(scope, path, TRACE_MEMORY) for scope, path in paths.items()}
+        else:
+            futures = {scope: pool.submit(read_source, scope, path, TRACE_MEMORY)
+                       for scope, path in paths.items()}
+            read = {scope: future.result() for scope, future in futures.items()}
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    results = {}
+    for scope, (result, stats) in read.items():
+        metrics.record('read', scope, stats)
+        results[scope] = result
+    return results
+
+
+def fetch_all(scopes, cache_dir=CACHE_DIR, workers=PARSE_WORKERS, known=None):
+    """Download and read the sources `scopes` concurrently.
+
+    Every source is downloaded on its own thread, with its own retries and
+    timeout, and read on a pool of `workers` processes as soon as it is
+    complete (on the download thread with fewer than two workers). `known`
+    holds validators by scope from an earlier fetch, sent so that an
+    unchanged source is neither downloaded nor read. Returns (results,
+    validators, errors), each keyed by scope: read_counts() results of the
+    sources that changed, validators of all that worked, and the exception
+    of those that did not.
+    """
+    pool = parse_pool(workers)
+    known = known or {}
+
+    def fetch_one(scope):
+        with metrics.timer('fetch', scope):
+            path, validators = fetch_with_retries(SOURCES[scope][0], known.get(scope),
+                                                  cache_dir=cache_dir)
+        if path is None:
+            return None, validators
+        if pool is None:
+            return read_source(scope, path, TRACE_MEMORY), validators
+        return pool.submit(read_source, scope, path, TRACE_MEMORY).result(), validators
+
+    results, validators, errors = {}, {}, {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(scopes), 1)) as threads:
+            futures = {scope: threads.submit(fetch_one, scope) for scope in scopes}
+            for scope, future in futures.items():
+                try:
+                    read, validators[scope] = future.result()
+                except Exception as err:
+                    errors[scope] = err
+                    continue
+                if read is not None:
+                    results[scope], stats = read
+                    metrics.record('read', scope, stats)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results, validators, errors
+
+
+def build_region(results):
+    """Align the sources of one region and build their matrices and rollups.
+
+    `results` holds read_counts() results by scope. Every matrix gets the
+    same locations (the union, zero where a file has no row) and the same
+    days (those all files have), so switching metric never changes rows or
+    the slider range. Rolling up happens here once, so every level is
+    served from precomputed rows.
+    """
+    names = functools.reduce(np.union1d, (result[0] for result in results.values()))
+    names = np.asarray(names, dtype=object)
+    dates = dataset.common_dates(result[1] for result in results.values())
+    parent_of = {}
+    for scope_names, _, _, parents in results.values():
+        if parents is not None:
+            parent_of.update(zip(scope_names, parents))
+    parents = pd.Categorical([parent_of.get(name) for name in names]) if parent_of else None
+
+    scopes = {}
+    for scope, (scope_names, _, counts, _) in results.items():
+        with metrics.timer('totals', scope):
+            counts = dataset.align_rows(scope_names, counts[:, :len(dates)], names)
+            scopes[scope] = dataset.LocationMatrix(
+                names, dates, counts, dataset.lookup_codes(names, SOURCES[scope][2]),
+                parent=None if parents is None else parents.codes)
+        rollup = rollup_of(scope)
+        if rollup:
+            with metrics.timer('rollup', rollup):
+                scopes[rollup] = dataset.rollup(
+                    scopes[scope], parents.categories.to_numpy(dtype=object),
+                    ROLLUPS[rollup][2])
+    # Names the code tables do not know, each with the first scope it is in
+    unresolved = {}
+    for scope, matrix in scopes.items():
+        for name in dataset.unresolved_names(matrix.names, code_table(scope)):
+            unresolved.setdefault(name, scope)
+    if unresolved:
+        logger.warning('No map code for %d locations, left off the map: %s', len(unresolved),
+                       ', '.join('%s (%s)' % item for item in sorted(unresolved.items())))
+    return scopes
+
+
+def version_dir(version, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, 'v-' + version)
+
+
+def current_version(cache_dir=CACHE_DIR):
+    """The version CURRENT points at, or None before the first publish."""
+    try:
+        with open(os.path.join(cache_dir, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def read_meta(cache_dir=CACHE_DIR, version=None):
+    version = version or current_version(cache_dir)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(version_dir(version, cache_dir), 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(directory, data, sources):
+    """Write the meta.json of `data` to `directory`, replacing any old one in one step."""
+    meta = {'version': data.version, 'scopes': {}}
+    for scope, matrix in data.scopes.items():
+        meta['scopes'][scope] = dict(sources.get(scope, {}), names=matrix.names.tolist(),
+                                     dates=matrix.dates)
+    path = os.path.join(directory, 'meta.json')
+    partial = '%s.tmp-%d-%d' % (path, os.getpid(), threading.get_ident())
+    with open(partial, 'w') as f:
+        json.dump(meta, f)
+    os.replace(partial, path)
+
+
+def publish(data, sources, cache_dir=CACHE_DIR):
+    """Write `data` as a snapshot version and point CURRENT at it.
+
+    `sources` holds, per scope, where the data came from and its HTTP
+    validators. The version directory is complete before it is renamed into
+    place and CURRENT is replaced in one step, so readers in other processes
+    either see the old version or the new one.
+    """
+    target = version_dir(data.version, cache_dir)
+    if os.path.isdir(target):
+        # The same data fetched again: only where and when it came from is new
+        write_meta(target, data, sources)
+    else:
+        staging = target + '.tmp-%d' % os.getpid()
+        os.makedirs(staging)
+        for scope, matrix in data.scopes.items():
+            for name, array in matrix.arrays().items():
+                np.save(os.path.join(staging, '%s.%s.npy' % (scope, name)), array)
+        write_meta(staging, data, sources)
+        os.rename(staging, target)
+
+    pointer = os.path.join(cache_dir, 'CURRENT')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(data.version)
+    os.replace(pointer + '.tmp', pointer)
+    prune(cache_dir, keep=data.version)
+
+
+def prune(cache_dir=CACHE_DIR, keep=None):
+    """Delete all but the newest KEEP_VERSIONS snapshot versions.
+
+    Processes that still map an old version keep working: the files stay
+    readable until they are unmapped.
+    """
+    versions = sorted((entry for entry in os.scandir(cache_dir)
+                       if entry.is_dir() and entry.name.startswith('v-')
+                       and '.tmp-' not in entry.name),
+                      key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[KEEP_VERSIONS:]:
+        if entry.name != 'v-' + str(keep):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def attach(cache_dir=CACHE_DIR, version=None):
+    """Memory-map a published snapshot as a Dataset, or None if there is none.
+
+    Nothing is copied or recomputed: every process attached to the same
+    version shares one copy of the arrays through the page cache.
+    """
+    version = version or current_version(cache_dir)
+    meta = read_meta(cache_dir, version)
+    if meta is None:
+        return None
+    directory = version_dir(version, cache_dir)
+    scopes = {}
+    try:
+        for scope, scope_meta in meta['scopes'].items():
+            arrays = {}
+            for path in glob.glob(os.path.join(glob.escape(directory), scope + '.*.npy')):
+                name = os.path.basename(path)[len(scope) + 1:-len('.npy')]
+                arrays[name] = np.load(path, mmap_mode='r')
+            names = scope_meta['names']
+            scopes[scope] = dataset.LocationMatrix(
+                names, scope_meta['dates'], arrays.pop('counts'),
+                dataset.lookup_codes(names, code_table(scope)), arrays)
+    except (OSError, ValueError, KeyError):
+        logger.warning('Snapshot %s is unreadable', version, exc_info=True)
+        return None
+    return dataset.Dataset(scopes, version)
+
+
+def source_info(scope, validators, fetched_at=None):
+    return {'source': SOURCES[scope][0], 'validators': validators or {},
+            'fetched_at': time.time() if fetched_at is None else fetched_at}
+
+
+def is_stale(scope, meta, max_age=MAX_AGE):
+    info = (meta or {}).get('scopes', {}).get(scope)
+    return (info is None or info.get('source') != SOURCES[scope][0]
+            or time.time() - info.get('fetched_at', 0) > max_age)
+
+
+def known_validators(scopes, sources, cache_dir=CACHE_DIR):
+    """Validators to send for the sources of `scopes`, from their snapshot info.
+
+    Only sources whose last download is still on disk can skip the next
+    one, since a changed source in the same region has to read them again.
+    """
+    known = {}
+    for scope in scopes:
+        info = sources.get(scope, {})
+        url = SOURCES.get(scope, (None,))[0]
+        if (url and info.get('source') == url and info.get('validators')
+                and os.path.exists(local_path(url, cache_dir))):
+            known[scope] = info['validators']
+    return known
+
+
+def load(refresh=REFRESH, cache_dir=CACHE_DIR):
+    """Return a Dataset holding every configured scope.
+
+    The published snapshot is used as is unless `refresh` asks for new
+    data. A region is refetched as a whole, all of its sources at once with
+    the validators of the snapshot, and the result is published as a new
+    version. When nothing changed, only the fetch times in the snapshot's
+    meta.json are updated.
+    """
+    with metrics.timer('snapshot'):
+        data = attach(cache_dir)
+    meta = read_meta(cache_dir) if data is not None else None
+    scopes = dict(data.scopes) if data is not None else {}
+    if refresh == 'never':
+        if data is None:
+            raise FileNotFoundError('No snapshot in %s' % cache_dir)
+        return data
+
+    regions = [region for region, members in REGIONS.items()
+               if refresh == 'always' or any(scope not in scopes or is_stale(scope, meta)
+                                             for scope in members)]
+    if not regions:
+        return data
+    sources = dict(meta['scopes']) if meta else {}
+    results, validators, errors = fetch_all(
+        [scope for region in regions for scope in REGIONS[region]], cache_dir,
+        known=known_validators(scopes, sources, cache_dir))
+
+    fetched = rebuilt = False
+    for region in regions:
+        members = REGIONS[region]
+        failed = [scope for scope in members if scope in errors]
+        if members[0] in failed or any(scope in scopes for scope in failed):
+            # Offline: an old snapshot is better than no dashboard. The
+            # region is kept as it was, so its metrics stay aligned
+            if members[0] not in scopes:
+                raise errors.get(members[0]) or errors[failed[0]]
+            for scope in failed:
+                logger.warning('Could not refresh %s data, using cached snapshot',
+                               scope, exc_info=errors[scope])
+            continue
+        if failed:
+            # Deaths and recoveries are optional: the region is loaded
+            # without them, and they are tried again on the next load or
+            # refresh.Refresher poll
+            for scope in failed:
+                logger.warning('Could not fetch %s data, loading %s without it',
+                               scope, region, exc_info=errors[scope])
+            members = [scope for scope in members if scope not in errors]
+        changed = [scope for scope in members if scope in results]
+        if changed:
+            # Sources that did not change are read from their last download
+            results.update(read_all({scope: local_path(SOURCES[scope][0], cache_dir)
+                                     for scope in members if scope not in results}))
+            scopes.update(build_region({scope: results[scope] for scope in members}))
+            rebuilt = True
+        for scope in members:
+            sources[scope] = source_info(scope, validators[scope])
+        fetched = True
+
+    if not fetched:
+        return data
+    if rebuilt:
+        data = dataset.Dataset(scopes)
+    with metrics.timer('publish'):
+        publish(data, sources, cache_dir)
+    return data
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    TRACE_MEMORY = True
+    start = time.perf_counter()
+    for scope, matrix in load(refresh='always').scopes.items():
+        print('%s: %d locations x %d days' % ((scope,) + matrix.counts.shape))
+    print('Snapshot written to %s in %.2fs' % (CACHE_DIR, time.perf_counter() - start))
@@ -0,0 +1,273 @@
+"""Map codes for the locations named in the John Hopkins files.
+
+Choropleths are drawn from these codes (USPS codes with
+locationmode='USA-states', ISO 3166-1 alpha-3 codes with 'ISO-3'), so the
+browser never has to match location names against its own list of
+countries. A name mapped to None is known to have no place on the map
+(cruise ships, the Olympics); any name missing from a table is reported by
+ingest.py when the data is read.
+"""
+US_STATE_CODES = {
+    'Alabama': 'AL',
+    'Alaska': 'AK',
+    'American Samoa': 'AS',
+    'Arizona': 'AZ',
+    'Arkansas': 'AR',
+    'California': 'CA',
+    'Colorado': 'CO',
+    'Connecticut': 'CT',
+    'Delaware': 'DE',
+    'Diamond Princess': None,
+    'District of Columbia': 'DC',
+    'Florida': 'FL',
+    'Georgia': 'GA',
+    'Grand Princess': None,
+    'Guam': 'GU',
+    'Hawaii': 'HI',
+    'Idaho': 'ID',
+    'Illinois': 'IL',
+    'Indiana': 'IN',
+    'Iowa': 'IA',
+    'Kansas': 'KS',
+    'Kentucky': 'KY',
+    'Louisiana': 'LA',
+    'Maine': 'ME',
+    'Maryland': 'MD',
+    'Massachusetts': 'MA',
+    'Michigan': 'MI',
+    'Minnesota': 'MN',
+    'Mississippi': 'MS',
+    'Missouri': 'MO',
+    'Montana': 'MT',
+    'Nebraska': 'NE',
+    'Nevada': 'NV',
+    'New Hampshire': 'NH',
+    'New Jersey': 'NJ',
+    'New Mexico': 'NM',
+    'New York': 'NY',
+    'North Carolina': 'NC',
+    'North Dakota': 'ND',
+    'Northern Mariana Islands': 'MP',
+    'Ohio': 'OH',
+    'Oklahoma': 'OK',
+    'Oregon': 'OR',
+    'Pennsylvania': 'PA',
+    'Puerto Rico': 'PR',
+    'Rhode Island': 'RI',
+    'South Carolina': 'SC',
+    'South Dakota': 'SD',
+    'Tennessee': 'TN',
+    'Texas': 'TX',
+    'Utah': 'UT',
+    'Vermont': 'VT',
+    'Virgin Islands': 'VI',
+    'Virginia': 'VA',
+    'Washington': 'WA',
+    'West Virginia': 'WV',
+    'Wisconsin': 'WI',
+    'Wyoming': 'WY',
+}
+
+COUNTRY_CODES = {
+    'Afghanistan': 'AFG',
+    'Albania': 'ALB',
+    'Algeria': 'DZA',
+    'Andorra': 'AND',
+    'Angola': 'AGO',
+    'Antarctica': 'ATA',
+    'Antigua and Barbuda': 'ATG',
+    'Argentina': 'ARG',
+    'Armenia': 'ARM',
+    'Australia': 'AUS',
+    'Austria': 'AUT',
+    'Azerbaijan': 'AZE',
+    'Bahamas': 'BHS',
+    'Bahrain': 'BHR',
+    'Bangladesh': 'BGD',
+    'Barbados': 'BRB',
+    'Belarus': 'BLR',
+    'Belgium': 'BEL',
+    'Belize': 'BLZ',
+    'Benin': 'BEN',
+    'Bhutan': 'BTN',
+    'Bolivia': 'BOL',
+    'Bosnia and Herzegovina': 'BIH',
+    'Botswana': 'BWA',
+    'Brazil': 'BRA',
+    'Brunei': 'BRN',
+    'Bulgaria': 'BGR',
+    'Burkina Faso': 'BFA',
+    'Burma': 'MMR',
+    'Burundi': 'BDI',
+    'Cabo Verde': 'CPV',
+    'Cambodia': 'KHM',
+    'Cameroon': 'CMR',
+    'Canada': 'CAN',
+    'Central African Republic': 'CAF',
+    'Chad': 'TCD',
+    'Chile': 'CHL',
+    'China': 'CHN',
+    'Colombia': 'COL',
+    'Comoros': 'COM',
+    'Congo (Brazzaville)': 'COG',
+    'Congo (Kinshasa)': 'COD',
+    'Costa Rica': 'CRI',
+    "Cote d'Ivoire": 'CIV',
+    'Croatia': 'HRV',
+    'Cuba': 'CUB',
+    'Cyprus': 'CYP',
+    'Czechia': 'CZE',
+    'Denmark': 'DNK',
+    'Diamond Princess': None,
+    'Djibouti': 'DJI',
+    'Dominica': 'DMA',
+    'Dominican Republic': 'DOM',
+    'Ecuador': 'ECU',
+    'Egypt': 'EGY',
+    'El Salvador': 'SLV',
+    'Equatorial Guinea': 'GNQ',
+    'Eritrea': 'ERI',
+    'Estonia': 'EST',
+    'Eswatini': 'SWZ',
+    'Ethiopia': 'ETH',
+    'Fiji': 'FJI',
+    'Finland': 'FIN',
+    'France': 'FRA',
+    'Gabon': 'GAB',
+    'Gambia': 'GMB',
+    'Georgia': 'GEO',
+    'Germany': 'DEU',
+    'Ghana': 'GHA',
+    'Greece': 'GRC',
+    'Grenada': 'GRD',
+    'Guatemala': 'GTM',
+    'Guinea': 'GIN',
+    'Guinea-Bissau': 'GNB',
+    'Guyana': 'GUY',
+    'Haiti': 'HTI',
+    'Holy See': 'VAT',
+    'Honduras': 'HND',
+    'Hungary': 'HUN',
+    'Iceland': 'ISL',
+    'India': 'IND',
+    'Indonesia': 'IDN',
+    'Iran': 'IRN',
+    'Iraq': 'IRQ',
+    'Ireland': 'IRL',
+    'Israel': 'ISR',
+    'Italy': 'ITA',
+    'Jamaica': 'JAM',
+    'Japan': 'JPN',
+    'Jordan': 'JOR',
+    'Kazakhstan': 'KAZ',
+    'Kenya': 'KEN',
+    'Kiribati': 'KIR',
+    'Korea, North': 'PRK',
+    'Korea, South': 'KOR',
+    'Kosovo': 'XKX',
+    'Kuwait': 'KWT',
+    'Kyrgyzstan': 'KGZ',
+    'Laos': 'LAO',
+    'Latvia': 'LVA',
+    'Lebanon': 'LBN',
+    'Lesotho': 'LSO',
+    'Liberia': 'LBR',
+    'Libya': 'LBY',
+    'Liechtenstein': 'LIE',
+    'Lithuania': 'LTU',
+    'Luxembourg': 'LUX',
+    'MS Zaandam': None,
+    'Madagascar': 'MDG',
+    'Malawi': 'MWI',
+    'Malaysia': 'MYS',
+    'Maldives': 'MDV',
+    'Mali': 'MLI',
+    'Malta': 'MLT',
+    'Marshall Islands': 'MHL',
+    'Mauritania': 'MRT',
+    'Mauritius': 'MUS',
+    'Mexico': 'MEX',
+    'Micronesia': 'FSM',
+    'Moldova': 'MDA',
+    'Monaco': 'MCO',
+    'Mongolia': 'MNG',
+    'Montenegro': 'MNE',
+    'Morocco': 'MAR',
+    'Mozambique': 'MOZ',
+    'Namibia': 'NAM',
+    'Nauru': 'NRU',
+    'Nepal': 'NPL',
+    'Netherlands': 'NLD',
+    'New Zealand': 'NZL',
+    'Nicaragua': 'NIC',
+    'Niger': 'NER',
+    'Nigeria': 'NGA',
+    'North Macedonia': 'MKD',
+    'Norway': 'NOR',
+    'Oman': 'OMN',
+    'Pakistan': 'PAK',
+    'Palau': 'PLW',
+    'Panama': 'PAN',
+    'Papua New Guinea': 'PNG',
+    'Paraguay': 'PRY',
+    'Peru': 'PER',
+    'Philippines': 'PHL',
+    'Poland': 'POL',
+    'Portugal': 'PRT',
+    'Qatar': 'QAT',
+    'Romania': 'ROU',
+    'Russia': 'RUS',
+    'Rwanda': 'RWA',
+    'Saint Kitts and Nevis': 'KNA',
+    'Saint Lucia': 'LCA',
+    'Saint Vincent and the Grenadines': 'VCT',
+    'Samoa': 'WSM',
+    'San Marino': 'SMR',
+    'Sao Tome and Principe': 'STP',
+    'Saudi Arabia': 'SAU',
+    'Senegal': 'SEN',
+    'Serbia': 'SRB',
+    'Seychelles': 'SYC',
+    'Sierra Leone': 'SLE',
+    'Singapore': 'SGP',
+    'Slovakia': 'SVK',
+    'Slovenia': 'SVN',
+    'Solomon Islands': 'SLB',
+    'Somalia': 'SOM',
+    'South Africa': 'ZAF',
+    'South Sudan': 'SSD',
+    'Spain': 'ESP',
+    'Sri Lanka': 'LKA',
+    'Sudan': 'SDN',
+    'Summer Olympics 2020': None,
+    'Suriname': 'SUR',
+    'Sweden': 'SWE',
+    'Switzerland': 'CHE',
+    'Syria': 'SYR',
+    'Taiwan*': 'TWN',
+    'Tajikistan': 'TJK',
+    'Tanzania': 'TZA',
+    'Thailand': 'THA',
+    'Timor-Leste': 'TLS',
+    'Togo': 'TGO',
+    'Tonga': 'TON',
+    'Trinidad and Tobago': 'TTO',
+    'Tunisia': 'TUN',
+    'Turkey': 'TUR',
+    'Tuvalu': 'TUV',
+    'US': 'USA',
+    'Uganda': 'UGA',
+    'Ukraine': 'UKR',
+    'United Arab Emirates': 'ARE',
+    'United Kingdom': 'GBR',
+    'Uruguay': 'URY',
+    'Uzbekistan': 'UZB',
+    'Vanuatu': 'VUT',
+    'Venezuela': 'VEN',
+    'Vietnam': 'VNM',
+    'West Bank and Gaza': 'PSE',
+    'Winter Olympics 2022': None,
+    'Yemen': 'YEM',
+    'Zambia': 'ZMB',
+    'Zimbabwe': 'ZWE',
+}
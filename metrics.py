@@ -0,0 +1,375 @@
+"""Lightweight instrumentation exposed in the Prometheus text format.
+
+instrument(app) wraps every server-side Dash callback to record its
+latency, calls, errors, prevented updates and serialized response size, and
+adds a /metrics route to app.server. Data loading records how long each
+ingestion stage took (and, for reads, their peak memory) through `timer()`.
+Recording a call costs two clock reads and a few uncontended locks, so it
+can stay on under load.
+
+Set COVID_CALLBACK_LOG=1 to also log one JSON line per callback call.
+
+Under gunicorn every process keeps its own values, so COVID_METRICS_DIR
+(set by gunicorn.conf.py) names a directory they all write theirs to, once
+a second and at exit. /metrics then reports the whole server whichever
+worker answers: counters and histograms are summed over every process
+that wrote there, exited ones included, and gauges are reported per live
+process with a `pid` label.
+"""
+import atexit
+import bisect
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from dash.exceptions import PreventUpdate
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_LOG = os.environ.get('COVID_CALLBACK_LOG', '') == '1'
+METRICS_DIR = os.environ.get('COVID_METRICS_DIR', '')
+WRITE_INTERVAL = 1.0
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) for name, value in labels)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metric:
+    """A named family of values, one per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels[name]) for name in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def values(self):
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self._values.items()}
+
+    def header(self):
+        return ['# HELP %s %s' % (self.name, self.help_text),
+                '# TYPE %s %s' % (self.name, self.kind)]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, values, key, value, pid, alive):
+        """Add `value`, written by process `pid`, to the merged `values`."""
+        values[key] = values.get(key, 0) + value
+
+    def render(self, values=None):
+        values = sorted((self.values() if values is None else values).items())
+        return self.header() + ['%s%s %s' % (self.name, format_labels(key), value)
+                                for key, value in values]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def merge(self, values, key, value, pid, alive):
+        if alive:
+            values[key + (('pid', pid),)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the running sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def merge(self, values, key, value, pid, alive):
+        counts = values.setdefault(key, [0] * len(value))
+        for index, count in enumerate(value):
+            counts[index] += count
+
+    def render(self, values=None):
+        values = sorted((self.values() if values is None else values).items())
+        lines = self.header()
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (
+                    self.name, format_labels(key + (('le', bound),)), cumulative))
+            lines.append('%s_sum%s %s' % (self.name, format_labels(key), counts[-1]))
+            lines.append('%s_count%s %d' % (self.name, format_labels(key), cumulative))
+        return lines
+
+
+class Registry:
+    """The metrics of this process, or with `directory` those of every
+    process writing its values there."""
+
+    def __init__(self, directory=''):
+        self.metrics = []
+        self.collectors = []
+        self.directory = directory
+        self._written = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """`collect()` is called on every scrape, e.g. to refresh gauges."""
+        self.collectors.append(collect)
+
+    def collect(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception('Metrics collector failed')
+
+    def write(self):
+        """Write the values of this process to the directory if they changed."""
+        self.collect()
+        state = {metric.name: [[list(key), value] for key, value in metric.values().items()]
+                 for metric in self.metrics}
+        if not any(state.values()):
+            return
+        state = json.dumps(state)
+        if state == self._written:
+            return
+        path = os.path.join(self.directory, 'metrics-%d.json' % os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            f.write(state)
+        os.replace(path + '.tmp', path)
+        self._written = state
+
+    def merged(self):
+        """The values written by every process, merged, by metric name."""
+        values = {metric.name: {} for metric in self.metrics}
+        for name in os.listdir(self.directory):
+            match = re.fullmatch(r'metrics-(\d+)\.json', name)
+            if match is None:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = int(match.group(1))
+            alive = is_alive(pid)
+            for metric in self.metrics:
+                for key, value in state.get(metric.name, []):
+                    metric.merge(values[metric.name], tuple(map(tuple, key)), value, pid, alive)
+        return values
+
+    def render(self):
+        if self.directory:
+            self.write()
+            values = self.merged()
+        else:
+            self.collect()
+            values = {}
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(values.get(metric.name)))
+        return '\n'.join(lines) + '\n'
+
+    def start_writer(self, interval=WRITE_INTERVAL):
+        """Write the values of this process every `interval` seconds and at exit."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write()
+                except Exception:
+                    logger.exception('Writing metrics failed')
+
+        threading.Thread(target=run, name='metrics-writer', daemon=True).start()
+
+    def after_fork(self):
+        # A forked worker starts with the values of its parent, which the
+        # parent goes on reporting itself
+        for metric in self.metrics:
+            metric._lock = threading.Lock()
+            metric.clear()
+        self._written = None
+        self.start_writer()
+
+
+registry = Registry(METRICS_DIR)
+if METRICS_DIR:
+    registry.start_writer()
+    atexit.register(registry.write)
+    os.register_at_fork(after_in_child=registry.after_fork)
+
+callback_seconds = registry.register(Histogram(
+    'dash_callback_seconds', 'Time spent in a Dash callback, serialization included.',
+    labels=('callback',)))
+callback_calls = registry.register(Counter(
+    'dash_callback_calls_total', 'Dash callback invocations.', labels=('callback',)))
+callback_errors = registry.register(Counter(
+    'dash_callback_errors_total', 'Dash callbacks that raised an error.', labels=('callback',)))
+callback_prevented = registry.register(Counter(
+    'dash_callback_prevented_total', 'Dash callbacks that raised PreventUpdate.',
+    labels=('callback',)))
+callback_bytes = registry.register(Histogram(
+    'dash_callback_response_bytes', 'Serialized size of Dash callback responses.',
+    labels=('callback',), buckets=SIZE_BUCKETS))
+ingest_seconds = registry.register(Gauge(
+    'covid_ingest_seconds', 'Duration of the last run of each data loading stage.',
+    labels=('stage', 'scope')))
+ingest_peak_bytes = registry.register(Gauge(
+    'covid_ingest_peak_bytes', 'Peak memory allocated by the last run of a data loading stage.',
+    labels=('stage', 'scope')))
+ingest_runs = registry.register(Counter(
+    'covid_ingest_runs_total', 'Runs of each data loading stage.', labels=('stage', 'scope')))
+
+
+_trace_lock = threading.RLock()
+
+
+@contextmanager
+def timer(stage, scope='', trace_memory=False):
+    """Record how long the block took as the last duration of `stage`.
+
+    With `trace_memory`, the most memory allocated at once inside the block
+    is recorded as well, as traced by tracemalloc. The tracer is shared by
+    the whole process, so traced blocks on different threads run one at a
+    time. The block gets a dict holding 'seconds' and 'peak_bytes', filled
+    in when it exits.
+    """
+    stats = {'seconds': 0.0, 'peak_bytes': 0}
+    with _trace_lock if trace_memory else nullcontext():
+        tracing = trace_memory and not tracemalloc.is_tracing()
+        if trace_memory:
+            if not tracing and hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                # Started here, or restarted to clear the peak where
+                # reset_peak() is missing (before Python 3.9)
+                tracemalloc.stop()
+                tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = time.perf_counter() - start
+            if trace_memory:
+                stats['peak_bytes'] = tracemalloc.get_traced_memory()[1] - baseline
+            if tracing:
+                tracemalloc.stop()
+            record(stage, scope, stats)
+
+
+def record(stage, scope, stats):
+    """Record the stats of a `timer()` block, e.g. one run in another process."""
+    ingest_seconds.set(stats['seconds'], stage=stage, scope=scope)
+    ingest_runs.inc(stage=stage, scope=scope)
+    if stats['peak_bytes']:
+        ingest_peak_bytes.set(stats['peak_bytes'], stage=stage, scope=scope)
+
+
+def instrument_callback(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = 'ok'
+        size = 0
+        try:
+            response = func(*args, **kwargs)
+            # Dash's wrapper returns the response already serialized
+            if isinstance(response, (str, bytes)):
+                size = len(response)
+            return response
+        except PreventUpdate:
+            status = 'prevented'
+            callback_prevented.inc(callback=name)
+            raise
+        except Exception:
+            status = 'error'
+            callback_errors.inc(callback=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            callback_calls.inc(callback=name)
+            callback_seconds.observe(elapsed, callback=name)
+            if size:
+                callback_bytes.observe(size, callback=name)
+            if CALLBACK_LOG:
+                logger.info(json.dumps({'callback': name, 'status': status,
+                                        'seconds': round(elapsed, 6), 'bytes': size}))
+    return wrapper
+
+
+def instrument(app):
+    """Wrap every registered server-side callback and serve /metrics."""
+    for output, entry in app.callback_map.items():
+        func = entry.get('callback')
+        if func is None or getattr(func, 'instrumented', False):
+            continue
+        wrapper = instrument_callback(getattr(func, '__name__', output), func)
+        wrapper.instrumented = True
+        entry['callback'] = wrapper
+
+    if 'metrics' not in app.server.view_functions:
+        @app.server.route('/metrics')
+        def metrics():
+            return app.server.response_class(
+                registry.render(), mimetype='text/plain; version=0.0.4')
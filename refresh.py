@@ -0,0 +1,237 @@
+"""Background refresh of the JHU data without restarting the server.
+
+A Refresher polls every source with conditional requests. When the
+sources of a region have new date columns, only the columns all of them
+have are parsed and appended to the current matrices (states get the new
+days of their counties summed through the rollup index), and the
+DatasetStore is swapped to a new Dataset in one step. New locations, or a
+revised count on the last loaded day, fall back to reading that region in
+full; revisions further back are picked up by the next full load
+(`python ingest.py` or a restart with a stale cache). Deaths or
+recoveries that could not be loaded are tried on every poll, and their
+region is read in full once they are back.
+
+Set COVID_REFRESH_INTERVAL (seconds, 0 to disable) to change how often
+Dashboard.py polls. `python refresh.py` runs the same loop as a separate
+loader process for a multi-worker server (see gunicorn.conf.py).
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import dataset
+import ingest
+import metrics
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.environ.get('COVID_REFRESH_INTERVAL', 60 * 60))
+
+
+def apply_update(scopes, scope, path, dates):
+    """Extend source `scope` and its rollup to `dates` from the CSV at `path`.
+
+    Returns the updated matrices by scope, {} when there are no new days,
+    or None when the file cannot be applied incrementally.
+    """
+    matrix = scopes[scope]
+    if dates[:matrix.num_days] != matrix.dates:
+        return None
+    new_dates = dates[matrix.num_days:]
+    if not new_dates:
+        return {}
+
+    # The last day we already have is read too, to notice revised rows
+    names, _, counts, _ = ingest.read_counts(path, ingest.SOURCES[scope][1],
+                                             dates=dates[matrix.num_days - 1:])
+    if not np.isin(names, matrix.names).all():
+        return None
+    counts = dataset.align_rows(names, counts, matrix.names)
+    if (counts[:, 0] != matrix.counts[:, -1]).any():
+        return None
+    counts = counts[:, 1:]
+    updated = {scope: matrix.extend(new_dates, counts)}
+    rollup = ingest.rollup_of(scope)
+    if rollup in scopes:
+        # Same rows as before, so the rollup index still holds
+        order, starts = dataset.group_rows(matrix.parent, len(scopes[rollup].names))
+        updated[rollup] = scopes[rollup].extend(
+            new_dates, dataset.sum_rows(counts, order, starts))
+    return updated
+
+
+def update_region(scopes, paths):
+    """Bring the sources of one region, read from {scope: path}, up to date.
+
+    Only the days every file has are taken, so the metrics of a region stay
+    aligned; if any file cannot be applied incrementally the whole region
+    is read again. Returns the updated matrices by scope.
+    """
+    dates = dataset.common_dates(dataset.date_columns(ingest.parse(path, nrows=0).columns)
+                                 for path in paths.values())
+    updated = {}
+    for scope, path in paths.items():
+        matrices = apply_update(scopes, scope, path, dates)
+        if matrices is None:
+            return ingest.build_region(ingest.read_all(paths))
+        updated.update(matrices)
+    return updated
+
+
+class Refresher:
+    """Polls the sources every `interval` seconds on a daemon thread.
+
+    Every new Dataset is also published to the cache directory, which is
+    how processes attached with a SnapshotFollower pick it up.
+    """
+
+    def __init__(self, store, interval=REFRESH_INTERVAL, cache_dir=ingest.CACHE_DIR):
+        self.store = store
+        self.interval = interval
+        self.cache_dir = cache_dir
+        meta = ingest.read_meta(cache_dir) or {}
+        self.sources = dict(meta.get('scopes', {}))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Check every source once; returns True if the dataset was swapped.
+
+        New validators are only kept once the data they were sent for is
+        swapped in and published, so a poll that fails partway fetches the
+        same changes again next time.
+        """
+        scopes = dict(self.store.current.scopes)
+        sources = {}
+        updated = []
+        for region, members in ingest.REGIONS.items():
+            fetched, errors = self.fetch(members)
+            if members[0] in errors or any(scope in scopes for scope in errors):
+                # As in ingest.load(), the region is kept as it was
+                for scope in errors:
+                    logger.warning('Could not refresh %s data, keeping %s as it is',
+                                   scope, region, exc_info=errors[scope])
+                continue
+            for scope in errors:
+                logger.warning('Could not fetch %s data, still serving %s without it',
+                               scope, region, exc_info=errors[scope])
+            members = [scope for scope in members if scope in fetched]
+            paths = {scope: ingest.local_path(ingest.SOURCES[scope][0], self.cache_dir)
+                     for scope in members}
+            if any(scope not in scopes for scope in members):
+                # An optional source that failed before is back: read the
+                # region again, so its locations and days line up
+                matrices = ingest.build_region(ingest.read_all(paths))
+            elif any(fetched[scope][0] is not None for scope in members):
+                matrices = update_region(scopes, paths)
+            else:
+                matrices = {}
+            scopes.update(matrices)
+            updated.extend(matrices)
+            for scope in members:
+                sources[scope] = ingest.source_info(scope, fetched[scope][1])
+
+        if not sources:
+            return False
+        data = dataset.Dataset(scopes) if updated else self.store.current
+        if updated:
+            self.store.swap(data)
+        # Unchanged data is published too: the snapshot records when it was
+        # last checked
+        ingest.publish(data, dict(self.sources, **sources), self.cache_dir)
+        self.sources.update(sources)
+        if not updated:
+            return False
+        logger.info('Refreshed %s, now version %s with %d days', ', '.join(updated),
+                    data.version, max(matrix.num_days for matrix in scopes.values()))
+        return True
+
+    def fetch(self, scopes):
+        """Fetch `scopes` concurrently; returns ({scope: (path, validators)},
+        {scope: exception}), with path None for the sources that have not
+        changed.
+
+        A source without a local copy from an earlier fetch is downloaded
+        again whether it changed or not.
+        """
+        def fetch_one(scope):
+            url = ingest.SOURCES[scope][0]
+            validators = self.sources.get(scope, {}).get('validators')
+            if not os.path.exists(ingest.local_path(url, self.cache_dir)):
+                validators = None
+            return ingest.fetch_with_retries(url, validators, cache_dir=self.cache_dir)
+
+        fetched, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=len(scopes)) as threads:
+            futures = {scope: threads.submit(fetch_one, scope) for scope in scopes}
+            for scope, future in futures.items():
+                try:
+                    fetched[scope] = future.result()
+                except Exception as err:
+                    errors[scope] = err
+        return fetched, errors
+
+    def run_forever(self):
+        if self.interval <= 0:
+            return
+        while not self._stop.wait(self.interval):
+            try:
+                with metrics.timer('refresh'):
+                    self.run_once()
+            except Exception:
+                logger.exception('Data refresh failed, keeping current dataset')
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self.run_forever, name='data-refresh',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+class SnapshotFollower:
+    """Keeps a store on the snapshot version published in the cache directory.
+
+    Used by server workers that do not fetch data themselves. `check()` is
+    cheap enough to call before every request: it reads the CURRENT pointer
+    at most once per `interval` seconds, and all workers switch within that
+    interval of the loader publishing a version.
+    """
+
+    def __init__(self, store, cache_dir=ingest.CACHE_DIR, interval=1.0):
+        self.store = store
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = now + self.interval
+            version = ingest.current_version(self.cache_dir)
+            if version is None or version == self.store.current.version:
+                return False
+            data = ingest.attach(self.cache_dir, version)
+            if data is None:
+                return False
+            self.store.swap(data)
+            logger.info('Switched to snapshot version %s', version)
+            return True
+        finally:
+            self._lock.release()
+
+
+if __name__ == "__main__":
+    # Stand-alone loader, e.g. next to gunicorn workers that only attach
+    logging.basicConfig(level=logging.INFO)
+    Refresher(dataset.DatasetStore(ingest.load())).run_forever()
@@ -0,0 +1,137 @@
+import functools
+import os
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import ingest  # noqa: E402
+import synthetic  # noqa: E402
+
+# synthetic.write() file name -> the scope read from it
+SCOPES = {
+    'us': 'us_county',
+    'us_deaths': 'us_county_deaths',
+    'global': 'global',
+    'global_deaths': 'global_deaths',
+    'global_recovered': 'global_recovered',
+}
+
+# Small enough to read in well under a second: 165 counties in 2 states,
+# 14 rows in 9 countries, 45 days
+LOCATION_SCALE = 0.05
+DAY_SCALE = 0.1
+
+
+class SourceHandler(SimpleHTTPRequestHandler):
+    """Serves the files of a directory like the JHU repository does, with
+    Last-Modified and 304s, plus a few ways to misbehave."""
+
+    # path -> number of 500s to answer before serving it
+    failures = {}
+    # paths whose body stalls after the headers
+    stalled = set()
+    # paths whose connection closes partway through the body
+    truncated = set()
+
+    def do_GET(self):
+        if self.failures.get(self.path):
+            self.failures[self.path] -= 1
+            self.send_error(500)
+            return
+        if self.path in self.stalled or self.path in self.truncated:
+            self.send_response(200)
+            self.send_header('Content-Length', str(1 << 20))
+            self.end_headers()
+            self.wfile.write(b'x' * 1024)
+            self.wfile.flush()
+            if self.path in self.stalled:
+                # Not time.sleep(), which the tests patch out for retries
+                self.server.released.wait(5)
+            self.close_connection = True
+            return
+        super().do_GET()
+
+    def log_request(self, code='-', size='-'):
+        self.server.statuses.append((self.path, int(code)))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    directory = tmp_path / 'sources'
+    synthetic.write(str(directory), LOCATION_SCALE, DAY_SCALE)
+    return directory
+
+
+@pytest.fixture
+def server(source_dir):
+    """A local stand-in for the JHU server; yields its base URL and server."""
+    handler = functools.partial(SourceHandler, directory=str(source_dir))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    httpd.daemon_threads = True
+    httpd.statuses = []
+    httpd.released = threading.Event()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d/' % httpd.server_port, httpd
+    httpd.released.set()
+    httpd.shutdown()
+    httpd.server_close()
+    SourceHandler.failures.clear()
+    SourceHandler.stalled.clear()
+    SourceHandler.truncated.clear()
+
+
+def point_sources(monkeypatch, base):
+    """Read every source from `base`, a URL or a directory."""
+    for name, scope in SCOPES.items():
+        _, key, codes = ingest.SOURCES[scope]
+        if ingest.is_url(base):
+            location = base + name + '.csv'
+        else:
+            location = os.path.join(base, name + '.csv')
+        monkeypatch.setitem(ingest.SOURCES, scope, (location, key, codes))
+
+
+@pytest.fixture
+def served(monkeypatch, server):
+    """ingest reading every source from the local server."""
+    base, httpd = server
+    point_sources(monkeypatch, base)
+    monkeypatch.setattr(ingest.time, 'sleep', lambda seconds: None)
+    return httpd
+
+
+@pytest.fixture(scope='session')
+def dashboard(tmp_path_factory):
+    """Dashboard.py, imported with a synthetic dataset."""
+    directory = tmp_path_factory.mktemp('sources')
+    synthetic.write(str(directory), LOCATION_SCALE, DAY_SCALE)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        point_sources(monkeypatch, str(directory))
+        data = ingest.load(refresh='always', cache_dir=str(tmp_path_factory.mktemp('cache')))
+        monkeypatch.setattr(ingest, 'load', lambda: data)
+        import Dashboard
+    return Dashboard
+
+
+def touch(path, seconds=10):
+    # Last-Modified has a resolution of a second, so move it clearly ahead
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + seconds))
+
+
+def assert_same_matrix(actual, expected):
+    assert list(actual.names) == list(expected.names)
+    assert actual.dates == expected.dates
+    for name, array in expected.arrays().items():
+        np.testing.assert_allclose(actual.arrays()[name], array, equal_nan=True, err_msg=name)
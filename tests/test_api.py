@@ -0,0 +1,94 @@
+import flask
+import numpy as np
+import pytest
+
+import api
+import dataset
+import ingest
+from conftest import point_sources
+
+
+@pytest.fixture
+def client(monkeypatch, source_dir, tmp_path):
+    point_sources(monkeypatch, str(source_dir))
+    store = dataset.DatasetStore(ingest.load(refresh='always', cache_dir=str(tmp_path / 'cache')))
+    server = flask.Flask(__name__)
+    api.register(server, store)
+    client = server.test_client()
+    client.store = store
+    return client
+
+
+def test_scopes(client):
+    response = client.get('/api/scopes')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['version'] == client.store.current.version
+    assert set(body['scopes']) == set(client.store.current.scopes)
+
+
+def test_series(client):
+    data = client.store.current
+    names = list(data['global'].names[:2])
+    response = client.get('/api/series', query_string={
+        'scope': 'global', 'loc': ','.join(names), 'from': '2020-01-23', 'to': '2020-01-25'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['locations'] == names
+    assert body['dates'] == ['2020-01-23', '2020-01-24', '2020-01-25']
+    assert body['values'] == data['global'].counts[:2, 1:4].tolist()
+
+
+def test_series_not_modified(client):
+    path = '/api/series?scope=us&metric=new'
+    first = client.get(path)
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    second = client.get(path, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    # As sent back for a Brotli-compressed response
+    compressed = client.get(path, headers={'If-None-Match': etag[:-1] + ':br"'})
+    assert compressed.status_code == 304
+
+    other = client.get('/api/series?scope=us&metric=growth', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+
+
+def test_series_derived_metric(client):
+    matrix = client.store.current['us']
+    name = matrix.names[0]
+    body = client.get('/api/series', query_string={
+        'scope': 'us', 'loc': name, 'metric': 'new_avg'}).get_json()
+    assert len(body['dates']) == matrix.num_days
+    np.testing.assert_allclose(body['values'][0], matrix.derived.new_avg[0], rtol=1e-6)
+
+
+def test_new_data_changes_etag(client):
+    path = '/api/series?scope=global'
+    etag = client.get(path).headers['ETag']
+    data = client.store.current
+    matrix = data['global']
+    scopes = dict(data.scopes)
+    scopes['global'] = dataset.LocationMatrix(matrix.names, matrix.dates, matrix.counts + 1,
+                                              matrix.codes)
+    client.store.swap(dataset.Dataset(scopes))
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['values'][0][-1] == matrix.counts[0, -1] + 1
+
+
+@pytest.mark.parametrize('query', [
+    'scope=nowhere',
+    'scope=global&loc=Atlantis',
+    'scope=global&from=March',
+    'scope=global&metric=median',
+])
+def test_series_bad_request(client, query):
+    response = client.get('/api/series?' + query)
+    assert response.status_code == 400
+    assert response.get_json()['error']
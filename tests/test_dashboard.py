@@ -0,0 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_layout_is_served_pre_rendered(dashboard):
+    client = dashboard.app.server.test_client()
+    # On a thread of its own, as under a threaded server
+    with ThreadPoolExecutor(1) as thread:
+        response = thread.submit(client.get, '/_dash-layout').result()
+    assert response.status_code == 200
+    layout = response.get_data(as_text=True)
+    for graph in ('us_line_graph', 'us_map', 'global_line_graph_2', 'global_pie'):
+        assert '"id":"%s"' % graph in layout.replace(' ', '')
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import dataset
+import location_codes
+
+
+@pytest.fixture
+def matrix():
+    counts = [[1, 4], [2, 9], [3, 1], [0, 9], [5, 7]]
+    return dataset.LocationMatrix(['A', 'B', 'C', 'D', 'E'], ['1/22/20', '1/23/20'], counts)
+
+
+@pytest.mark.parametrize('n, names', [
+    (0, []),
+    (-2, []),
+    # Ties keep row order
+    (2, ['B', 'D']),
+    (3, ['B', 'D', 'E']),
+    (10, ['B', 'D', 'E', 'A', 'C']),
+])
+def test_top(matrix, n, names):
+    assert matrix.names[matrix.top(n)].tolist() == names
+
+
+def test_top_of_another_day(matrix):
+    assert matrix.names[matrix.top(2, day=0)].tolist() == ['E', 'C']
+
+
+def test_rows(matrix):
+    rows = matrix.rows(['E', 'Atlantis', 'A'])
+    assert rows.tolist() == [4, 0]
+    assert matrix.counts[rows, -1].tolist() == [7, 4]
+    assert matrix.rows([]).dtype == np.intp
+
+
+def test_resolve_codes():
+    table = {'France': 'FRA', 'Diamond Princess': None, 'US': 'USA'}
+    names = ['US', 'Atlantis', 'Diamond Princess', 'France', 'Zanzibar', 'Aaland']
+    codes, found = dataset.resolve_codes(names, table)
+    assert codes.tolist() == ['USA', None, None, 'FRA', None, None]
+    assert found.tolist() == [True, False, True, True, False, False]
+    # Only names missing from the table are reported, not those known to be unmapped
+    assert dataset.unresolved_names(names, table) == ['Atlantis', 'Zanzibar', 'Aaland']
+
+
+def test_resolve_codes_of_nothing():
+    codes, found = dataset.resolve_codes([], {'US': 'USA'})
+    assert len(codes) == len(found) == 0
+    assert dataset.lookup_codes(['US'], {}).tolist() == [None]
+    assert dataset.unresolved_names(['US'], None) == []
+
+
+def test_state_codes():
+    names = list(location_codes.US_STATE_CODES)
+    codes = dataset.lookup_codes(names, location_codes.US_STATE_CODES)
+    mapped = [code for code in codes if code is not None]
+    assert [name for name, code in zip(names, codes) if code is None] == [
+        'Diamond Princess', 'Grand Princess']
+    assert len(set(mapped)) == len(mapped)
+    assert all(len(code) == 2 and code.isupper() for code in mapped)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import derived
+
+
+@pytest.fixture
+def counts():
+    # Cumulative counts of a few locations, one of them without any cases
+    rng = np.random.default_rng(0)
+    counts = np.cumsum(rng.integers(0, 50, size=(4, 30)), axis=1)
+    counts[1, :5] = 0
+    counts[3] = 0
+    return counts
+
+
+def test_series_match_pandas(counts):
+    series = derived.DerivedSeries(counts)
+    frame = pd.DataFrame(counts.T.astype(float))
+    new = frame.diff().fillna(frame)
+    new_avg = new.rolling(derived.ROLLING_WINDOW, min_periods=1).mean()
+    growth = (frame.diff() / frame.shift()).where(frame.shift() > 0)
+    growth_avg = growth.fillna(0).rolling(derived.ROLLING_WINDOW, min_periods=1).mean()
+
+    np.testing.assert_array_equal(series.new, new.T)
+    np.testing.assert_allclose(series.new_avg, new_avg.T, rtol=1e-6)
+    np.testing.assert_allclose(series.growth, growth.T, rtol=1e-6)
+    np.testing.assert_allclose(series.growth_avg, growth_avg.T, rtol=1e-6)
+    doubling = (np.log(2) / np.log1p(growth_avg)).where(growth_avg > 0)
+    np.testing.assert_allclose(series.doubling, doubling.T, rtol=1e-5)
+
+
+@pytest.mark.parametrize('num_new', [1, 3, 10])
+def test_extend_matches_full_computation(counts, num_new):
+    extended = derived.DerivedSeries(counts[:, :-num_new]).extend(counts, num_new)
+    full = derived.DerivedSeries(counts)
+    for name in derived.SERIES:
+        np.testing.assert_allclose(getattr(extended, name), getattr(full, name),
+                                   rtol=1e-6, err_msg=name)
+
+
+def test_extend_without_new_days(counts):
+    series = derived.DerivedSeries(counts)
+    extended = series.extend(counts, 0)
+    for name in derived.SERIES:
+        np.testing.assert_array_equal(getattr(extended, name), getattr(series, name))
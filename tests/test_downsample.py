@@ -0,0 +1,62 @@
+import numpy as np
+
+import downsample
+
+
+def lttb_reference(x, y, n_out):
+    """LTTB for one series, point by point."""
+    n = len(x)
+    edges = [int(i * (n - 2) // (n_out - 2)) + 1 for i in range(n_out - 1)]
+    kept = [0]
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (end, edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = np.mean(x[next_start:next_end]), np.mean(y[next_start:next_end])
+        a = kept[-1]
+        areas = [abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+                 for j in range(start, end)]
+        kept.append(start + int(np.argmax(areas)))
+    return kept + [n - 1]
+
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(1)
+    y = np.cumsum(rng.normal(size=(5, 500)), axis=1)
+    x = np.broadcast_to(np.arange(500), y.shape)
+    indices = downsample.lttb_indices(x, y, 40)
+    assert indices.shape == (5, 40)
+    for row in range(5):
+        assert indices[row].tolist() == lttb_reference(x[row], y[row], 40)
+
+
+def test_lttb_keeps_peaks_and_ends():
+    y = np.zeros((1, 1000))
+    y[0, 123] = 50
+    y[0, 777] = -50
+    indices = downsample.lttb_indices(np.arange(1000)[None, :], y, 20)[0]
+    assert {0, 123, 777, 999} <= set(indices.tolist())
+
+
+def test_short_series_are_kept_whole():
+    y = np.arange(12).reshape(2, 6)
+    assert downsample.lttb_indices(np.arange(6)[None, :], y, 10).tolist() == [
+        list(range(6))] * 2
+
+
+def test_downsample_rows_in_range():
+    x = np.arange(100)
+    y = np.vstack([x ** 2, -x])
+    rows = downsample.downsample_rows(x, y, 1000, x_range=(10, 20))
+    # The visible points plus one neighbour on each side, at full resolution
+    for (row_x, row_y), values in zip(rows, y):
+        assert row_x.tolist() == list(range(9, 22))
+        assert row_y.tolist() == values[9:22].tolist()
+
+
+def test_downsample_rows_with_own_x():
+    # e.g. new cases against each location's cumulative total
+    x = np.vstack([np.arange(50), np.arange(50) * 2])
+    y = np.ones((2, 50))
+    rows = downsample.downsample_rows(x, y, 1000, x_range=(0, 10))
+    assert rows[0][0].tolist() == list(range(12))
+    assert rows[1][0].tolist() == list(range(0, 14, 2))
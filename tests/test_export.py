@@ -0,0 +1,38 @@
+import json
+
+import dataset
+import export
+
+
+def changed_last_day(data, scope):
+    """`data` with one more case on the last day of the first mapped row of
+    `scope`, its counts widened to int64 as a refresh can do."""
+    matrix = data[scope]
+    counts = matrix.counts.astype(int)
+    counts[matrix.mapped.argmax(), -1] += 1
+    scopes = dict(data.scopes)
+    scopes[scope] = dataset.LocationMatrix(matrix.names, matrix.dates, counts, matrix.codes)
+    return dataset.Dataset(scopes)
+
+
+def test_export_renders_only_changed_days(dashboard, tmp_path):
+    data = dashboard.store.current
+    days = sum(data[scope].num_days for scope, _, _ in export.scopes_of(data))
+    lines = 2 * len(list(export.scopes_of(data)))
+
+    first = export.export(dashboard, str(tmp_path), workers=1)
+    assert (first['rendered'], first['skipped']) == (lines + days, 0)
+    again = export.export(dashboard, str(tmp_path), workers=1)
+    assert (again['rendered'], again['skipped']) == (lines, days)
+
+    dashboard.store.swap(changed_last_day(data, 'global'))
+    try:
+        changed = export.export(dashboard, str(tmp_path), workers=1)
+    finally:
+        dashboard.store.swap(data)
+    assert (changed['rendered'], changed['skipped']) == (lines + 1, days - 1)
+    with open(tmp_path / 'manifest.json') as f:
+        assert json.load(f)['version'] != data.version
+
+    full = export.export(dashboard, str(tmp_path), workers=1, full=True)
+    assert (full['rendered'], full['skipped']) == (lines + days, 0)
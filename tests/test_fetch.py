@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+import ingest
+from conftest import SourceHandler, point_sources
+
+
+def test_fetch_retries_server_errors(served, tmp_path):
+    SourceHandler.failures['/global.csv'] = 2
+    path, _ = ingest.fetch_with_retries(ingest.SOURCES['global'][0], attempts=3,
+                                        cache_dir=str(tmp_path))
+    assert [status for _, status in served.statuses] == [500, 500, 200]
+    assert pd.read_csv(path).shape[0] > 0
+
+
+def test_fetch_gives_up_on_stalled_download(served, tmp_path):
+    SourceHandler.stalled.add('/global.csv')
+    with pytest.raises(OSError):
+        ingest.fetch_source(ingest.SOURCES['global'][0], timeout=0.5, cache_dir=str(tmp_path))
+    assert not list((tmp_path / 'downloads').iterdir())
+
+
+def test_fetch_rejects_truncated_download(served, tmp_path):
+    SourceHandler.truncated.add('/global.csv')
+    with pytest.raises(ConnectionError):
+        ingest.fetch_with_retries(ingest.SOURCES['global'][0], attempts=2,
+                                  cache_dir=str(tmp_path))
+    assert [status for _, status in served.statuses] == [200, 200]
+    assert not list((tmp_path / 'downloads').iterdir())
+
+
+def test_load_without_optional_source(monkeypatch, source_dir, tmp_path):
+    point_sources(monkeypatch, str(source_dir))
+    (source_dir / 'global_recovered.csv').unlink()
+    data = ingest.load(refresh='always', cache_dir=str(tmp_path / 'cache'))
+    assert data.metrics('global') == ['confirmed', 'deaths']
+    assert data.metrics('us') == ['confirmed', 'deaths']
+
+
+def test_load_requires_confirmed_cases(monkeypatch, source_dir, tmp_path):
+    point_sources(monkeypatch, str(source_dir))
+    (source_dir / 'global.csv').unlink()
+    with pytest.raises(FileNotFoundError):
+        ingest.load(refresh='always', cache_dir=str(tmp_path / 'cache'))
+
+
+def test_load_aligns_metrics(monkeypatch, source_dir, tmp_path):
+    # Deaths a day behind and without one of the countries
+    deaths = pd.read_csv(source_dir / 'global_deaths.csv')
+    rows = deaths.groupby('Country/Region').size()
+    missing = rows[rows == 1].index[0]
+    deaths = deaths[deaths['Country/Region'] != missing]
+    deaths.iloc[:, :-1].to_csv(source_dir / 'global_deaths.csv', index=False)
+    point_sources(monkeypatch, str(source_dir))
+    data = ingest.load(refresh='always', cache_dir=str(tmp_path / 'cache'))
+
+    confirmed, deaths = data['global'], data['global_deaths']
+    assert list(deaths.names) == list(confirmed.names)
+    assert deaths.dates == confirmed.dates
+    assert confirmed.num_days == 44
+    assert confirmed.row(missing).any() and not deaths.row(missing).any()
@@ -0,0 +1,58 @@
+import figure_cache
+
+
+def renderer(calls, value):
+    def render():
+        calls.append(value)
+        return {'data': [], 'layout': {'title': value}}
+    return render
+
+
+def test_least_recently_used_is_evicted():
+    cache = figure_cache.FigureCache(maxsize=2)
+    calls = []
+    for day in (1, 2, 1, 3, 1, 2):
+        cache.get('v1', day, renderer(calls, day))
+    # 2 was the least recently used when 3 came in
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats()['size'] == 2
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 4)
+
+
+def test_figures_come_back_as_rendered():
+    cache = figure_cache.FigureCache(maxsize=2)
+    calls = []
+
+    def render():
+        calls.append('pair')
+        return {'data': [{'z': [1, 2]}]}, {'data': []}
+
+    first = cache.get('v1', 'pair', render)
+    assert first == ({'data': [{'z': [1, 2]}]}, {'data': []})
+    assert cache.get('v1', 'pair', render) == first
+    assert calls == ['pair']
+
+
+def test_current_version_replaces_the_cache():
+    current = ['v1']
+    cache = figure_cache.FigureCache(maxsize=4, current_version=lambda: current[0])
+    calls = []
+    cache.get('v1', 1, renderer(calls, 'v1'))
+    current[0] = 'v2'
+    cache.get('v2', 1, renderer(calls, 'v2'))
+    assert cache.stats()['version'] == 'v2'
+    cache.get('v2', 1, renderer(calls, 'v2'))
+    assert calls == ['v1', 'v2']
+
+
+def test_older_version_neither_stored_nor_clearing():
+    current = ['v2']
+    cache = figure_cache.FigureCache(maxsize=4, current_version=lambda: current[0])
+    calls = []
+    cache.get('v2', 1, renderer(calls, 'v2'))
+    # A request still holding the dataset it started with
+    assert cache.get('v1', 1, renderer(calls, 'v1')) == {'data': [], 'layout': {'title': 'v1'}}
+    cache.get('v1', 1, renderer(calls, 'v1'))
+    cache.get('v2', 1, renderer(calls, 'v2'))
+    assert calls == ['v2', 'v1', 'v1']
+    assert cache.stats()['version'] == 'v2'
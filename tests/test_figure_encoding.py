@@ -0,0 +1,46 @@
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+
+import figure_encoding
+
+DTYPES = {'i1': np.int8, 'u1': np.uint8, 'i2': np.int16, 'u2': np.uint16,
+          'i4': np.int32, 'u4': np.uint32, 'f4': np.float32, 'f8': np.float64}
+
+
+def decode(spec):
+    """What plotly.js reads from a typed array spec."""
+    return np.frombuffer(base64.b64decode(spec['bdata']), dtype=DTYPES[spec['dtype']])
+
+
+@pytest.mark.parametrize('values, code', [
+    (np.array([0, 5, -3]), 'i1'),
+    (np.array([0, 200]), 'u1'),
+    (np.array([-1, 30000]), 'i2'),
+    (np.array([0, 60000]), 'u2'),
+    (np.array([-1, 2 ** 20]), 'i4'),
+    (np.array([0, 2 ** 31]), 'u4'),
+    (np.array([0, 2 ** 40]), 'f8'),
+    (np.array([0.5, np.nan, 1e6]), 'f4'),
+])
+def test_typed_array_round_trip(values, code):
+    spec = figure_encoding.typed_array(values)
+    assert spec['dtype'] == code
+    np.testing.assert_array_equal(decode(spec), values.astype(DTYPES[code]))
+
+
+def test_compact_figure():
+    days = np.arange(3, 40)
+    fig = go.Figure(go.Scattergl(x=days, y=days.astype(np.float64) / 7))
+    fig.add_trace(go.Scattergl(x=np.array([1, 2, 4]), y=np.array([10, 20, 40])))
+    figure = figure_encoding.compact_figure(fig)
+
+    first, second = figure['data']
+    # Consecutive days are sent as a start and a step
+    assert 'x' not in first and (first['x0'], first['dx']) == (3, 1)
+    np.testing.assert_allclose(decode(first['y']), days / 7, rtol=1e-6)
+    assert decode(second['x']).tolist() == [1, 2, 4]
+    assert decode(second['y']).tolist() == [10, 20, 40]
+    assert set(figure['layout']['template']['data']) == {'scattergl'}
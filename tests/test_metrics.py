@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+
+
+def shared_registry(directory):
+    registry = metrics.Registry(str(directory))
+    calls = registry.register(metrics.Counter('calls_total', 'Calls.', labels=('callback',)))
+    days = registry.register(metrics.Gauge('days', 'Days.'))
+    seconds = registry.register(metrics.Histogram('seconds', 'Seconds.', buckets=(0.1, 1.0)))
+    return registry, calls, days, seconds
+
+
+def write_state(directory, pid, registry):
+    state = {metric.name: [[list(key), value] for key, value in metric.values().items()]
+             for metric in registry.metrics}
+    (directory / ('metrics-%d.json' % pid)).write_text(json.dumps(state))
+
+
+def test_metrics_of_every_process(tmp_path):
+    # Another live process, and one that has exited
+    other = os.getppid()
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True).stdout.strip()
+    for pid in (other, int(exited)):
+        registry, calls, days, seconds = shared_registry(tmp_path)
+        calls.inc(callback='render_map')
+        days.set(40)
+        seconds.observe(0.5)
+        write_state(tmp_path, pid, registry)
+
+    registry, calls, days, seconds = shared_registry(tmp_path)
+    calls.inc(2, callback='render_map')
+    days.set(45)
+    seconds.observe(0.05)
+    lines = registry.render().splitlines()
+
+    assert 'calls_total{callback="render_map"} 4' in lines
+    assert 'seconds_bucket{le="0.1"} 1' in lines
+    assert 'seconds_count 3' in lines
+    # Gauges only of the processes still running
+    assert sorted(line for line in lines if line.startswith('days{')) == sorted([
+        'days{pid="%d"} 45' % os.getpid(), 'days{pid="%d"} 40' % other])
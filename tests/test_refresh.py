@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+import dataset
+import ingest
+import refresh
+from conftest import SCOPES, SourceHandler, assert_same_matrix, point_sources, touch
+
+
+def without_last_days(source_dir, days=3):
+    """Drop the last `days` of every source; returns a function restoring them."""
+    complete = {name: pd.read_csv(source_dir / (name + '.csv')) for name in SCOPES}
+    for name, frame in complete.items():
+        frame.iloc[:, :-days].to_csv(source_dir / (name + '.csv'), index=False)
+
+    def restore():
+        for name, frame in complete.items():
+            frame.to_csv(source_dir / (name + '.csv'), index=False)
+            touch(source_dir / (name + '.csv'))
+    return restore
+
+
+def test_refresh_equals_full_load(served, source_dir, tmp_path):
+    restore = without_last_days(source_dir)
+    cache_dir = str(tmp_path / 'cache')
+    store = dataset.DatasetStore(ingest.load(refresh='always', cache_dir=cache_dir))
+    restore()
+
+    assert refresh.Refresher(store, cache_dir=cache_dir).run_once()
+    full = ingest.load(refresh='always', cache_dir=str(tmp_path / 'full'))
+    assert store.current.version == full.version
+    assert sorted(store.current.scopes) == sorted(full.scopes)
+    for scope, matrix in full.scopes.items():
+        assert_same_matrix(store.current[scope], matrix)
+    assert ingest.attach(cache_dir).version == full.version
+
+
+def test_refresh_after_failed_fetch(served, source_dir, tmp_path):
+    restore = without_last_days(source_dir)
+    cache_dir = str(tmp_path / 'cache')
+    store = dataset.DatasetStore(ingest.load(refresh='always', cache_dir=cache_dir))
+    restore()
+    SourceHandler.failures['/global_recovered.csv'] = 100
+
+    refresher = refresh.Refresher(store, cache_dir=cache_dir)
+    assert refresher.run_once()
+    assert store.current['us'].num_days == 45
+    assert store.current['global'].num_days == 42
+    # The failed region was neither applied nor recorded, so it is fetched again
+    SourceHandler.failures.clear()
+    assert refresher.run_once()
+    assert store.current['global'].num_days == 45
+    assert ingest.attach(cache_dir).version == store.current.version
+
+
+def test_refresh_adds_optional_source(served, source_dir, tmp_path):
+    recovered = source_dir / 'global_recovered.csv'
+    content = recovered.read_bytes()
+    recovered.unlink()
+    cache_dir = str(tmp_path / 'cache')
+    store = dataset.DatasetStore(ingest.load(refresh='always', cache_dir=cache_dir))
+    assert 'global_recovered' not in store.current.scopes
+
+    refresher = refresh.Refresher(store, cache_dir=cache_dir)
+    assert not refresher.run_once()
+    recovered.write_bytes(content)
+    assert refresher.run_once()
+    full = ingest.load(refresh='always', cache_dir=str(tmp_path / 'full'))
+    assert store.current.version == full.version
+    assert_same_matrix(store.current['global_recovered'], full['global_recovered'])
+
+
+def test_refresh_without_changes(served, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    store = dataset.DatasetStore(ingest.load(refresh='always', cache_dir=cache_dir))
+    before = ingest.read_meta(cache_dir)['scopes']['global']['fetched_at']
+    assert not refresh.Refresher(store, cache_dir=cache_dir).run_once()
+    assert ingest.read_meta(cache_dir)['scopes']['global']['fetched_at'] > before
+
+
+def test_version_covers_every_count():
+    def version(counts):
+        matrix = dataset.LocationMatrix(['A', 'B'], ['1/22/20', '1/23/20'], counts)
+        return dataset.Dataset({'global': matrix}).version
+
+    assert version([[1, 5], [2, 10]]) == version([[1, 5], [2, 10]])
+    # Same totals, cases moved between locations
+    assert version([[1, 5], [2, 10]]) != version([[1, 0], [2, 15]])
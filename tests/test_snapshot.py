@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+import dataset
+import ingest
+import refresh
+from conftest import SCOPES, assert_same_matrix, point_sources
+
+
+def test_fetch_source_not_modified(served, tmp_path):
+    url = ingest.SOURCES['global'][0]
+    path, validators = ingest.fetch_source(url, cache_dir=str(tmp_path))
+    assert path is not None and validators['last_modified']
+
+    assert ingest.fetch_source(url, validators, cache_dir=str(tmp_path)) == (None, validators)
+    assert served.statuses[-1] == ('/global.csv', 304)
+
+
+def test_attach_maps_the_published_snapshot(monkeypatch, source_dir, tmp_path):
+    point_sources(monkeypatch, str(source_dir))
+    cache_dir = str(tmp_path / 'cache')
+    data = ingest.load(refresh='always', cache_dir=cache_dir)
+
+    attached = ingest.attach(cache_dir)
+    assert attached.version == data.version == ingest.current_version(cache_dir)
+    assert sorted(attached.scopes) == sorted(data.scopes)
+    for scope, matrix in data.scopes.items():
+        assert_same_matrix(attached[scope], matrix)
+        # Mapped read-only, not copied
+        assert not attached[scope].counts.flags.writeable
+        assert list(attached[scope].codes) == list(matrix.codes)
+
+
+def test_load_offline_from_snapshot(monkeypatch, source_dir, tmp_path):
+    point_sources(monkeypatch, str(source_dir))
+    cache_dir = str(tmp_path / 'cache')
+    data = ingest.load(refresh='always', cache_dir=cache_dir)
+    for name in os.listdir(source_dir):
+        os.remove(source_dir / name)
+
+    assert ingest.load(refresh='never', cache_dir=cache_dir).version == data.version
+    assert ingest.load(refresh='always', cache_dir=cache_dir).version == data.version
+
+
+def test_load_without_snapshot(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ingest.load(refresh='never', cache_dir=str(tmp_path / 'cache'))
+
+
+def test_refetch_of_unchanged_data(served, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    data = ingest.load(refresh='always', cache_dir=cache_dir)
+    before = ingest.read_meta(cache_dir)['scopes']
+    del served.statuses[:]
+
+    again = ingest.load(refresh='always', cache_dir=cache_dir)
+    assert again.version == data.version
+    assert {status for _, status in served.statuses} == {304}
+    after = ingest.read_meta(cache_dir)['scopes']
+    for scope in SCOPES.values():
+        assert after[scope]['fetched_at'] > before[scope]['fetched_at']
+
+
+def test_follower_switches_to_published_version(monkeypatch, source_dir, tmp_path):
+    point_sources(monkeypatch, str(source_dir))
+    cache_dir = str(tmp_path / 'cache')
+    ingest.load(refresh='always', cache_dir=cache_dir)
+    store = dataset.DatasetStore(ingest.attach(cache_dir))
+    follower = refresh.SnapshotFollower(store, cache_dir, interval=0)
+    assert not follower.check()
+
+    # The loader publishes a new version
+    matrix = store.current['global']
+    counts = matrix.counts + 1
+    scopes = dict(store.current.scopes)
+    scopes['global'] = dataset.LocationMatrix(matrix.names, matrix.dates, counts, matrix.codes)
+    data = dataset.Dataset(scopes)
+    ingest.publish(data, {}, cache_dir)
+    assert follower.check()
+    assert store.current.version == data.version
+    assert (store.current['global'].counts == counts).all()
@@ -0,0 +1,7 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+"""
+from Dashboard import app
+
+server = app.server